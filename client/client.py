@@ -2,9 +2,18 @@ import asyncio
 import json
 import uuid
 import math
+import struct
 import pygame
+from collections import deque
+from netcode import DeltaDecoder, SNAP_MAGIC, SNAP_VERSIONS, decode_snap, FRAG_MAGIC, MTU, Reassembler, Predictor
 import time
 
+# Optional: vectorized unwrap/projection for busy worlds; the plain Python path is kept
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 SERVER_ADDR = ("127.0.0.1", 9999)
 UUID = str(uuid.uuid4())
 
@@ -18,6 +27,12 @@ HALF_MAP = MAP_SIZE / 2
 BODY_RADIUS = 8
 HEAD_RADIUS = 13
 RENDER_SPACING = 6   # distance between circles
+AURA_COLOR = (209, 179, 196)
+# level of detail: sparser stamps for long snakes and far from the screen centre
+LOD_ENABLED = True
+LOD_SEGMENTS = 150   # snakes with more body points than this
+LOD_DISTANCE = 450   # pixels from the screen centre
+LOD_SPACING = 12     # still under 2 * BODY_RADIUS, so the body stays solid
 PLAYER_NAMES = {}  # maps UUID to temp player name storage
 font = None
 
@@ -28,11 +43,15 @@ OTHER_COLOR  = (209, 179, 196)
 HEAD_COLOR   = (255, 220, 220) # pale white 
 FOOD_COLOR = (255, 180, 200)  # pink
 
+# SNAPSHOT INTERPOLATION
+INTERP_DELAY = 0.1        # render this far behind real time (two snapshots at 20 Hz)
+MAX_EXTRAPOLATION = 0.25  # keep heads moving this long past the newest snapshot on loss
+BUFFER_SPAN = 1.0         # seconds of snapshots kept
+TRAIL_SPACING = 6         # core.SEGMENT_SPACING: position ids between trail points
+
 # SCOREBOARD
-SCORE_UPDATE = 0
-CACHED_SCORES = []
-SCOREBOARD_UPDATE_INTERVAL = 1.0
 SCORE_VISIBILITY = True
+SCOREBOARD_ROWS = 5
 
 class UDPClient(asyncio.DatagramProtocol):
     def __init__(self):
@@ -40,23 +59,65 @@ class UDPClient(asyncio.DatagramProtocol):
         self.angle = 0.0
         self.boost = False
         self.state = None
+        self.leaderboard = None  # newest LEADERBOARD message, about once a second
+        self.snapshots = SnapshotBuffer()
+        self.decoder = DeltaDecoder()
+        self.input_seq = 0  # lets the server drop reordered inputs
+        self.last_sent = None  # (seq, angle, boost) the server will simulate next
+        self.predictor = Predictor()
+        self.reassembler = Reassembler()
 
     def connection_made(self, transport):
         self.transport = transport
         print(f"[CLIENT] Connected as UUID {UUID}")
-        join_pkt = {"type": "JOIN", "uuid": UUID}
+        join_pkt = {"type": "JOIN", "uuid": UUID, "delta": True, "formats": list(SNAP_VERSIONS),
+                    "mtu": MTU, "leaderboard": True, "interpolate": True}
         self.send(join_pkt)
 
         asyncio.create_task(self.send_input_loop())
 
     def datagram_received(self, data, addr):
-        if b"DEAD" in data:
-            import sys
-            sys.exit(0)
-        try:
-            self.state = json.loads(data.decode("utf-8"))
-        except Exception:
+        if data[:4] == FRAG_MAGIC:
+            try:
+                data = self.reassembler.feed(data)
+            except struct.error:
+                return
+            if data is None:
+                return  # wait for the rest of the frame
+        if data[:4] == SNAP_MAGIC:
+            try:
+                pkt = decode_snap(data)
+            except (ValueError, struct.error):
+                return
+        else:
+            try:
+                pkt = json.loads(data.decode("utf-8"))
+            except Exception:
+                return
+            # by type only: LEADERBOARD and JSON states carry player names, which may contain "DEAD"
+            if pkt.get("type") == "DEAD":
+                import sys
+                sys.exit(0)
+            if pkt.get("type") == "WELCOME":
+                print(f"[CLIENT] Server sends binary snapshots v{pkt['format']}")
+                return
+            if pkt.get("type") == "LEADERBOARD":
+                self.leaderboard = pkt
+                return
+            if pkt.get("type") != "SNAP":
+                self.state = prepare_state(pkt)
+                self.snapshots.push(time.monotonic(), self.state)
+                return
+        state = self.decoder.apply(pkt)
+        if state is None:
             return
+        state = prepare_state(state)
+        self.state = state
+        self.snapshots.push(time.monotonic(), state)
+        echo = pkt.get("input")
+        if echo and UUID in state["players"]:
+            self.predictor.reconcile(state["players"][UUID], *echo)
+        self.send({"type": "ACK", "uuid": UUID, "seq": pkt["seq"]})
         
     def send(self, packet: dict):
         if not self.transport:
@@ -69,8 +130,11 @@ class UDPClient(asyncio.DatagramProtocol):
                 "type": "INPUT",
                 "uuid": UUID,
                 "inp": {"angle": self.angle, "boost": self.boost},
+                "seq": self.input_seq,
             }
             self.send(pkt)
+            self.last_sent = (self.input_seq, self.angle, self.boost)
+            self.input_seq += 1
             await asyncio.sleep(0.05)
 
 def get_shortest_diff(target, current, size):
@@ -93,6 +157,177 @@ def to_screen(wx, wy, cam_x, cam_y):
 
     return (WIN_W // 2) + dx, (WIN_H // 2) + dy
 
+def lerp_wrapped(a, b, t, size=MAP_SIZE):
+    return (a + get_shortest_diff(b, a, size) * t) % size
+
+class SnapshotBuffer:
+    """
+    Snapshots stamped with their arrival time, rendered `delay` seconds in
+    the past so there is usually one on either side to interpolate between.
+    The delay also absorbs network jitter. When snapshots stop arriving the
+    last two are extrapolated for up to MAX_EXTRAPOLATION seconds.
+    """
+    def __init__(self, delay=INTERP_DELAY):
+        self.delay = delay
+        self.snapshots = deque()  # (arrival time, state), oldest first
+
+    def push(self, t, state):
+        self.snapshots.append((t, state))
+        while len(self.snapshots) > 2 and t - self.snapshots[0][0] > BUFFER_SPAN:
+            self.snapshots.popleft()
+
+    def sample(self, now):
+        """The state to draw at time `now`, or None before the first snapshot."""
+        snaps = self.snapshots
+        if not snaps:
+            return None
+        render_t = now - self.delay
+        if len(snaps) == 1 or render_t <= snaps[0][0]:
+            return snaps[0][1]
+
+        if render_t >= snaps[-1][0]:
+            (t0, a), (t1, b) = snaps[-2], snaps[-1]
+            render_t = min(render_t, t1 + MAX_EXTRAPOLATION)
+        else:
+            # the bracketing pair is almost always at the new end
+            i = len(snaps) - 1
+            while snaps[i - 1][0] > render_t:
+                i -= 1
+            (t0, a), (t1, b) = snaps[i - 1], snaps[i]
+        if t1 <= t0:
+            return b
+        return blend_states(a, b, (render_t - t0) / (t1 - t0))
+
+def blend_states(a, b, alpha):
+    """State between snapshots a and b (alpha 0..1, above 1 extrapolates)."""
+    old_players = a["players"]
+    players = {}
+    for uid, p in b["players"].items():
+        q = old_players.get(uid)
+        if q is None or q.get("sid") != p.get("sid"):
+            players[uid] = p  # new or respawned, nothing to blend with
+        else:
+            players[uid] = blend_snake(q, p, alpha)
+    return {"players": players, "food": (a if alpha < 0.5 else b)["food"]}
+
+def blend_snake(q, p, alpha):
+    x = lerp_wrapped(q["x"], p["x"], alpha)
+    y = lerp_wrapped(q["y"], p["y"], alpha)
+    segs = p["segments"]
+    if "h" in p and "h" in q:
+        # delta snapshots: trail points stay put in the world, so only hide
+        # the ones b pushed that the interpolated head hasn't reached yet
+        pushed = (p["h"] - q["h"]) // TRAIL_SPACING
+        hidden = min(len(segs) - 2, max(0, pushed - round(pushed * alpha)))
+        segments = concat_points([[x, y]], segs[1 + hidden:])
+    elif np is not None:
+        old = q["segments"]
+        n = min(len(old), len(segs))
+        blended = (old[:n] + shortest_diff_np(segs[:n], old[:n], MAP_SIZE) * alpha) % MAP_SIZE
+        segments = np.concatenate((blended, segs[n:]))
+    else:
+        # plain states sample the body at fixed distances from the head, so
+        # every point moves and can be blended index by index
+        old = q["segments"]
+        segments = [[lerp_wrapped(o[0], n[0], alpha), lerp_wrapped(o[1], n[1], alpha)]
+                    for o, n in zip(old, segs)] + segs[len(old):]
+    return dict(p, x=x, y=y, segments=segments)
+
+def predict_local(state, protocol):
+    """
+    Swap our own snake in the interpolated state for the predicted one: the
+    predicted head, the path it took since the last snapshot, then the
+    newest body the server sent.
+    """
+    predictor = protocol.predictor
+    latest = protocol.state
+    if state is None or predictor.head is None or not latest or UUID not in latest["players"]:
+        return state
+    me = latest["players"][UUID]
+    hx, hy = predictor.position()
+    segments = concat_points([[hx, hy]], list(predictor.path)[1:], me["segments"][1:])
+    players = dict(state["players"])
+    players[UUID] = dict(me, x=hx, y=hy, segments=segments)
+    return dict(state, players=players)
+
+"""
+ARRAY PATH (numpy)
+"""
+def prepare_state(state):
+    """
+    Once per received snapshot: body points become (n, 2) float arrays and
+    food one (n, 3) array of x, y, size, so drawing works on whole arrays.
+    Without numpy the state is used as it is.
+    """
+    if np is None:
+        return state
+    food = state["food"]
+    food_arr = np.array([(f["x"], f["y"], f["size"]) for f in food], dtype=np.float64).reshape(-1, 3)
+    return {
+        "players": {uid: dict(p, segments=np.asarray(p["segments"], dtype=np.float64).reshape(-1, 2))
+                    for uid, p in state["players"].items()},
+        "food": food_arr,
+    }
+
+def concat_points(*parts):
+    if np is None:
+        out = []
+        for part in parts:
+            out.extend(part)
+        return out
+    return np.concatenate([np.asarray(part, dtype=np.float64).reshape(-1, 2) for part in parts])
+
+def shortest_diff_np(target, current, size):
+    """get_shortest_diff() on arrays."""
+    diff = target - current
+    diff = np.where(diff > size / 2, diff - size, diff)
+    return np.where(diff < -size / 2, diff + size, diff)
+
+def to_screen_np(wx, wy, cam_x, cam_y):
+    """to_screen() on arrays."""
+    return (WIN_W // 2) + shortest_diff_np(wx, cam_x, MAP_SIZE), (WIN_H // 2) + shortest_diff_np(wy, cam_y, MAP_SIZE)
+
+def stamp_points_np(segments, cam_x, cam_y, half, spacing):
+    """
+    stamp_points() in bulk: unwrap with a cumulative sum of wrapped steps,
+    project, cull pairs off screen and spread the stamps along each pair.
+    Returns: list of [x, y] int blit positions.
+    """
+    pts = segments
+    chain = np.empty_like(pts)
+    hx, hy = to_screen(pts[0, 0], pts[0, 1], cam_x, cam_y)
+    chain[0] = (hx, hy)
+    np.cumsum(shortest_diff_np(pts[1:], pts[:-1], MAP_SIZE), axis=0, out=chain[1:])
+    chain[1:] += chain[0]
+
+    s1, s2 = chain[:-1], chain[1:]
+    lo = (-half, -half)
+    hi = (WIN_W + half, WIN_H + half)
+    visible = ~(((s1 < lo) & (s2 < lo)) | ((s1 > hi) & (s2 > hi))).any(axis=1)
+    s1, d = s1[visible], (s2 - s1)[visible]
+    if not len(s1):
+        return []
+
+    dist = np.hypot(d[:, 0], d[:, 1])
+    step = np.full(len(s1), float(spacing))
+    if LOD_ENABLED:
+        off = s1 - (WIN_W / 2, WIN_H / 2)
+        step[(off * off).sum(axis=1) > LOD_DISTANCE * LOD_DISTANCE] = LOD_SPACING
+    steps = np.maximum(1, (dist / step).astype(np.int64))
+
+    pair = np.repeat(np.arange(len(s1)), steps)
+    first = np.repeat(np.cumsum(steps) - steps, steps)
+    ratio = (np.arange(len(pair)) - first) / steps[pair]
+    pos = s1[pair] + d[pair] * ratio[:, None]
+    return (pos.astype(np.int64) - half).tolist()
+
+def draw_food_np(screen, food, cam_x, cam_y):
+    fx, fy = to_screen_np(food[:, 0], food[:, 1], cam_x, cam_y)
+    visible = (fx >= -20) & (fx <= WIN_W + 20) & (fy >= -20) & (fy <= WIN_H + 20)
+    for x, y, size in zip(fx[visible].astype(np.int64).tolist(), fy[visible].astype(np.int64).tolist(),
+                          food[visible, 2].astype(np.int64).tolist()):
+        pygame.draw.circle(screen, FOOD_COLOR, (x, y), size)
+
 def unwrap_segments(points, mod_x=3000):
     if not points:
         return []
@@ -184,17 +419,44 @@ def draw_bg(screen, cam_x, cam_y, t):
     for y in range(int(off_y), h, grid_sz):
         pygame.draw.line(screen, line_col, (0, y), (w, y))
 
-def draw_aura(screen, sx, sy, r, t):
-    if sx < -50 or sx > WIN_W + 50 or sy < -50 or sy > WIN_H + 50:
-        return
-    pulse = 1 + 0.25 * math.sin(t * 6)
-    radius = int(r * pulse) + 3
-    pygame.draw.circle(screen, (209, 179, 196), (sx, sy), radius, width=2)
+_STAMPS = {}  # (color, radius, aura radius) -> Surface
+
+def snake_stamp(color, radius, aura_radius):
+    """
+    One body circle with its aura ring, pre-rendered once per color and
+    size. Blitting it draws the same pixels as the pulsing aura ring followed
+    by the body circle.
+    """
+    key = (tuple(color), radius, aura_radius)
+    stamp = _STAMPS.get(key)
+    if stamp is None:
+        half = max(radius, aura_radius)
+        stamp = pygame.Surface((2 * half + 1, 2 * half + 1), pygame.SRCALPHA)
+        pygame.draw.circle(stamp, AURA_COLOR, (half, half), aura_radius, width=2)
+        pygame.draw.circle(stamp, color, (half, half), radius)
+        stamp = _STAMPS[key] = stamp.convert_alpha()
+    return stamp
+
+def toggle_lod():
+    global LOD_ENABLED
+    LOD_ENABLED = not LOD_ENABLED
 
 def draw_snake(screen, segments, color, cam_x, cam_y, t, show_text=False):
     if len(segments) < 2:
         return
     
+    pulse = 1 + 0.25 * math.sin(t * 6)
+    stamp = snake_stamp(color, BODY_RADIUS, int(BODY_RADIUS * pulse) + 3)
+    half = stamp.get_width() // 2
+    spacing = LOD_SPACING if LOD_ENABLED and len(segments) > LOD_SEGMENTS else RENDER_SPACING
+    if np is not None:
+        points = stamp_points_np(segments, cam_x, cam_y, half, spacing)
+    else:
+        points = stamp_points(segments, cam_x, cam_y, half, spacing)
+    screen.blits([(stamp, p) for p in points], doreturn=False)
+
+def stamp_points(segments, cam_x, cam_y, half, spacing):
+    """Top-left blit positions of the body stamps, RENDER_SPACING apart along the body."""
     continuous_chain = unwrap_segments(segments, MAP_SIZE)
 
     head_raw = segments[0]
@@ -204,24 +466,37 @@ def draw_snake(screen, segments, color, cam_x, cam_y, t, show_text=False):
     offset_x = head_screen_x - chain_head_x
     offset_y = head_screen_y - chain_head_y
 
+    # a pair with both ends past the same screen edge can't put a stamp on screen
+    min_x, max_x = -half, WIN_W + half
+    min_y, max_y = -half, WIN_H + half
+    centre_x, centre_y = WIN_W / 2, WIN_H / 2
+    lod = LOD_ENABLED
+    far = LOD_DISTANCE * LOD_DISTANCE
+
+    points = []
     for i in range(len(continuous_chain) - 1):
         p1 = continuous_chain[i]
         p2 = continuous_chain[i+1]
         
         s1x, s1y = p1[0] + offset_x, p1[1] + offset_y
         s2x, s2y = p2[0] + offset_x, p2[1] + offset_y
+        if ((s1x < min_x and s2x < min_x) or (s1x > max_x and s2x > max_x)
+                or (s1y < min_y and s2y < min_y) or (s1y > max_y and s2y > max_y)):
+            continue
 
         dx, dy = s2x - s1x, s2y - s1y
         dist = math.hypot(dx, dy)
-        steps = max(1, int(dist / RENDER_SPACING))
+        step = spacing
+        if lod and (s1x - centre_x) ** 2 + (s1y - centre_y) ** 2 > far:
+            step = LOD_SPACING
+        steps = max(1, int(dist / step))
 
         for s in range(steps):
             ratio = s / steps
             ix = s1x + dx * ratio
             iy = s1y + dy * ratio
-            
-            draw_aura(screen, int(ix), int(iy), BODY_RADIUS, t)
-            pygame.draw.circle(screen, color, (int(ix), int(iy)), BODY_RADIUS)
+            points.append((int(ix) - half, int(iy) - half))
+    return points
 
 """
 SCOREBOARD RENDERING
@@ -230,32 +505,25 @@ def toggle_scoreboard():
     global SCORE_VISIBILITY
     SCORE_VISIBILITY = not SCORE_VISIBILITY
 
-def draw_scoreboard(screen, state):
-    global SCORE_UPDATE, CACHED_SCORES, PLAYER_NAMES, ui_font
+def draw_scoreboard(screen, board):
+    """The server's LEADERBOARD: top rows, and our own rank in the last row if we're below them."""
+    global PLAYER_NAMES, ui_font
     # ui frame settings
     panel_width = 220
     row_height = 30
     header_height = 36
     padding = 8
-    panel_height = header_height + row_height * 5 + padding * 2
+    panel_height = header_height + row_height * SCOREBOARD_ROWS + padding * 2
     x = WIN_W - panel_width - 10
     y = 10
 
-    if state is None or not SCORE_VISIBILITY:
+    if board is None or not SCORE_VISIBILITY:
         return
 
-    # update cached scores periodically instead of every frame
-    current_time = time.time()
-    if current_time - SCORE_UPDATE >= SCOREBOARD_UPDATE_INTERVAL:
-        scores = []
-        for uid, snake in state["players"].items():
-            score = len(snake["segments"])
-            scores.append((score, uid))
-        scores.sort(reverse=True, key=lambda x: x[0])
-        CACHED_SCORES = scores[:5]
-        SCORE_UPDATE = current_time
-
-    top_scores = CACHED_SCORES
+    rows = [(i + 1, uid, score) for i, (uid, score) in enumerate(board["top"][:SCOREBOARD_ROWS])]
+    you = board.get("you")
+    if you and you[0] > SCOREBOARD_ROWS:
+        rows[SCOREBOARD_ROWS - 1:] = [(you[0], UUID, you[1])]
     # margin
     panel_rect = pygame.Rect(x, y, panel_width, panel_height)
     pygame.draw.rect(screen, (40, 30, 50), panel_rect, border_radius=12)
@@ -273,12 +541,11 @@ def draw_scoreboard(screen, state):
 
     # player records
     yy = y + header_height + 4
-    for i in range(5):
-        if i < len(top_scores):
-            score, uid = top_scores[i]
+    for i in range(SCOREBOARD_ROWS):
+        if i < len(rows):
+            rank, uid, score = rows[i]
             is_me = (uid == UUID)
             # rank badge
-            rank = i + 1
             rank_color = (255, 215, 0) if rank == 1 else (200, 200, 200) if rank == 2 else (205, 127, 50) if rank == 3 else (200, 200, 200)
             rank_surface = ui_font.render(f"#{rank}", True, rank_color)
             screen.blit(rank_surface, (x + padding, yy + 2))
@@ -296,7 +563,7 @@ def draw_scoreboard(screen, state):
             
         yy += row_height
         
-def draw_game(screen, state, cam_x, cam_y):
+def draw_game(screen, state, cam_x, cam_y, board=None):
     t = pygame.time.get_ticks() * 0.001
     draw_bg(screen, cam_x, cam_y, t)
     text = font.render('kittens.io <3', False, (247, 209, 205))
@@ -304,10 +571,13 @@ def draw_game(screen, state, cam_x, cam_y):
     if state is None:
         return
     
-    for f in state["food"]:
-        fx, fy = to_screen(f["x"], f["y"], cam_x, cam_y)
-        if -20 <= fx <= WIN_W + 20 and -20 <= fy <= WIN_H + 20:
-            pygame.draw.circle(screen, FOOD_COLOR, (int(fx), int(fy)), f["size"])
+    if np is not None:
+        draw_food_np(screen, state["food"], cam_x, cam_y)
+    else:
+        for f in state["food"]:
+            fx, fy = to_screen(f["x"], f["y"], cam_x, cam_y)
+            if -20 <= fx <= WIN_W + 20 and -20 <= fy <= WIN_H + 20:
+                pygame.draw.circle(screen, FOOD_COLOR, (int(fx), int(fy)), f["size"])
 
     # Draw Snakes
     for uid, snake in state["players"].items():
@@ -329,7 +599,7 @@ def draw_game(screen, state, cam_x, cam_y):
         screen.blit(name_surface, name_rect)
     
     # Draw scoreboard
-    draw_scoreboard(screen, state)
+    draw_scoreboard(screen, board)
 
 async def run_game():
     player_name = get_player_name()
@@ -375,6 +645,8 @@ async def run_game():
                 elif event.type == pygame.KEYDOWN: 
                     if event.key == pygame.K_TAB:
                         toggle_scoreboard()
+                    elif event.key == pygame.K_l:
+                        toggle_lod()
             
             # Input handling
             mx, my = pygame.mouse.get_pos()
@@ -386,9 +658,14 @@ async def run_game():
             keys = pygame.key.get_pressed()
             protocol.boost = keys[pygame.K_SPACE] or pygame.mouse.get_pressed()[0]
 
+            state = protocol.snapshots.sample(time.monotonic())
+            if protocol.last_sent:
+                protocol.predictor.advance(dt / 1000, *protocol.last_sent)
+            state = predict_local(state, protocol)
+
             # Camera Logic
-            if protocol.state and UUID in protocol.state["players"]:
-                me = protocol.state["players"][UUID]
+            if state and UUID in state["players"]:
+                me = state["players"][UUID]
                 target_x, target_y = me['x'], me['y']
 
                 if not initialized_cam:
@@ -404,7 +681,7 @@ async def run_game():
                     cam_x %= MAP_SIZE
                     cam_y %= MAP_SIZE
 
-            draw_game(screen, protocol.state, cam_x, cam_y)
+            draw_game(screen, state, cam_x, cam_y, protocol.leaderboard)
             
             pygame.display.flip()
             await asyncio.sleep(0)
@@ -0,0 +1,317 @@
+"""
+Client-side decoding for the server's snapshot protocols.
+
+Kept free of pygame (and numpy) so it can be reused by tools and bots. The
+server-side counterparts live in server/delta.py, server/packets.py (which
+documents the binary layout) and server/fragment.py; Predictor mirrors the
+movement rules in server/core.py.
+"""
+
+import math
+import struct
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+HISTORY = 32
+MTU = 1200  # sent in JOIN; the server fragments anything bigger
+
+# ==========================================
+# Binary SNAP format (see server/packets.py)
+# ==========================================
+
+SNAP_MAGIC = b'SNAP'
+SNAP_VERSIONS = (1, 2)
+WORLD_W, WORLD_H = 3000, 3000
+
+_SNAP_HEADER = struct.Struct("<4sBBHII")
+_SNAP_PLAYER = struct.Struct("<HHHBfI")
+_SNAP_SID = struct.Struct("<I")
+_SNAP_INPUT = struct.Struct("<IH")
+_U16 = struct.Struct("<H")
+_X_UNIT = WORLD_W / 65535
+_Y_UNIT = WORLD_H / 65535
+_ANGLE_SCALE = 65535 / (2 * math.pi)
+
+
+@lru_cache(maxsize=512)
+def _points_struct(n):
+    return struct.Struct("<%dH" % (2 * n))
+
+
+@lru_cache(maxsize=512)
+def _snap_food_struct(n):
+    return struct.Struct("<" + "IHHB" * n)
+
+
+@lru_cache(maxsize=512)
+def _ids_struct(n):
+    return struct.Struct("<%dI" % n)
+
+
+def _unpack_points(data, off, n):
+    """Returns: ([(x, y), ...], new offset)."""
+    if not n:
+        return [], off
+    vals = _points_struct(n).unpack_from(data, off)
+    xs = map(_X_UNIT.__mul__, vals[0::2])
+    ys = map(_Y_UNIT.__mul__, vals[1::2])
+    return list(zip(xs, ys)), off + 4 * n
+
+
+def decode_snap(data):
+    """Binary SNAP datagram -> the message dict DeltaDecoder.apply() expects."""
+    magic, version, flags, n_players, seq, base = _SNAP_HEADER.unpack_from(data, 0)
+    if magic != SNAP_MAGIC or version not in SNAP_VERSIONS:
+        raise ValueError("unsupported snapshot format %r v%d" % (magic, version))
+    off = _SNAP_HEADER.size
+    echo = None
+    if flags & 2:
+        echo = list(_SNAP_INPUT.unpack_from(data, off))
+        off += _SNAP_INPUT.size
+    players = {}
+    for _ in range(n_players):
+        u_len = data[off]
+        uid = bytes(data[off + 1:off + 1 + u_len]).decode('utf-8')
+        kind = data[off + 1 + u_len]
+        off += 2 + u_len
+        x, y, angle, boost, length, first_id = _SNAP_PLAYER.unpack_from(data, off)
+        off += _SNAP_PLAYER.size
+        e = {"x": x * _X_UNIT, "y": y * _Y_UNIT, "angle": angle / _ANGLE_SCALE,
+             "boost": bool(boost), "length": length, "h": first_id}
+        if kind == 0:
+            (e["sid"],) = _SNAP_SID.unpack_from(data, off)
+            (n,) = _U16.unpack_from(data, off + 4)
+            e["segments"], off = _unpack_points(data, off + 6, n)
+        else:
+            (n,) = _U16.unpack_from(data, off)
+            e["push"], off = _unpack_points(data, off + 2, n)
+            (e["keep"],) = _U16.unpack_from(data, off)
+            (n,) = _U16.unpack_from(data, off + 2)
+            tail, off = _unpack_points(data, off + 4, n)
+            if tail:
+                e["tail"] = tail
+        players[uid] = e
+
+    (n,) = _U16.unpack_from(data, off)
+    vals = _snap_food_struct(n).unpack_from(data, off + 2)
+    off += 2 + 9 * n
+    food = list(zip(vals[0::4], map(_X_UNIT.__mul__, vals[1::4]),
+                    map(_Y_UNIT.__mul__, vals[2::4]), vals[3::4]))
+    msg = {"type": "SNAP", "seq": seq, "players": players}
+    if echo:
+        msg["input"] = echo
+    if flags & 1:
+        (n,) = _U16.unpack_from(data, off)
+        msg["base"] = base
+        msg["food_add"] = food
+        msg["food_del"] = list(_ids_struct(n).unpack_from(data, off + 2))
+    else:
+        msg["food"] = food
+    return msg
+
+
+# ==========================================
+# Delta snapshots (see server/delta.py)
+# ==========================================
+
+
+class DeltaDecoder:
+    """Rebuilds states from SNAP messages. Mirrors server/delta.py."""
+
+    def __init__(self, history=HISTORY):
+        self.history_len = history
+        self.states = OrderedDict()  # seq -> (players, food)
+        self.last_seq = 0
+
+    def apply(self, msg):
+        """
+        Returns: state dict in the usual {"players", "food"} shape, or None if
+        the message's baseline is unknown (it must then not be acked).
+        """
+        seq = msg["seq"]
+        if seq <= self.last_seq:
+            return None  # reordered, we already have something newer
+        if "base" not in msg:
+            players = msg["players"]
+            food = {fid: (x, y, size) for fid, x, y, size in msg["food"]}
+        else:
+            base = self.states.get(msg["base"])
+            if base is None:
+                return None
+            base_players, base_food = base
+            players = {}
+            for uid, e in msg["players"].items():
+                if "segments" in e:
+                    players[uid] = e
+                    continue
+                old = base_players.get(uid)
+                if old is None:
+                    return None
+                e["sid"] = old["sid"]
+                e["segments"] = e.pop("push") + old["segments"][:e.pop("keep")] + e.pop("tail", [])
+                players[uid] = e
+            food = dict(base_food)
+            for fid in msg["food_del"]:
+                food.pop(fid, None)
+            for fid, x, y, size in msg["food_add"]:
+                food[fid] = (x, y, size)
+            # the server never goes back to an older baseline
+            while next(iter(self.states)) != msg["base"]:
+                self.states.popitem(last=False)
+
+        self.last_seq = seq
+        self.states[seq] = (players, food)
+        while len(self.states) > self.history_len:
+            self.states.popitem(last=False)
+        # trail points can lag the head by a few samples, so draw from the head
+        return {
+            "players": {uid: dict(e, segments=[[e["x"], e["y"]]] + e["segments"])
+                        for uid, e in players.items()},
+            "food": [{"x": x, "y": y, "size": size} for x, y, size in food.values()],
+        }
+
+
+# ==========================================
+# Fragment reassembly (see server/fragment.py)
+# ==========================================
+
+FRAG_MAGIC = b'FRAG'
+_FRAG_HEADER = struct.Struct("<4sIHH")
+MAX_PENDING_FRAMES = 4
+
+
+class Reassembler:
+    """Rebuilds FRAG datagrams into payloads. Mirrors server/fragment.py."""
+
+    def __init__(self):
+        self.pending = {}  # frame -> {index: bytes}
+        self.counts = {}
+        self.last_done = -1
+        self.dropped = 0
+
+    def feed(self, data):
+        """Returns: the complete payload once its last chunk arrives, else None."""
+        _, frame, index, count = _FRAG_HEADER.unpack_from(data)
+        if frame <= self.last_done:
+            return None
+        chunks = self.pending.get(frame)
+        if chunks is None:
+            if len(self.pending) >= MAX_PENDING_FRAMES:
+                oldest = min(self.pending)
+                del self.pending[oldest], self.counts[oldest]
+                self.dropped += 1
+            chunks = self.pending[frame] = {}
+            self.counts[frame] = count
+        chunks[index] = bytes(data[_FRAG_HEADER.size:])
+        if len(chunks) < count:
+            return None
+
+        payload = b''.join(chunks[i] for i in range(count))
+        self.last_done = frame
+        for old in [f for f in self.pending if f <= frame]:
+            if old != frame:
+                self.dropped += 1
+            del self.pending[old], self.counts[old]
+        return payload
+
+
+# ==========================================
+# Client-side prediction (see core.Snake.simulate)
+# ==========================================
+
+TICK_RATE = 60            # server.py --tick-rate
+SEGMENT_SPACING = 6
+BASE_SPEED = 4.0
+BOOST_MULT = 2.3
+BOOST_COST = 0.09
+MAX_PREDICTED = 2 * TICK_RATE   # steps kept waiting for the server to confirm them
+CORRECTION_TIME = 0.1     # seconds to blend away a misprediction
+MAX_CORRECTION = 100.0    # further off than this and we just jump
+
+
+def simulate_head(head, desired, boost):
+    """
+    One tick of core.Snake.simulate for the head only.
+    head: (x, y, angle, length). Returns the next one.
+    """
+    x, y, angle, length = head
+    diff = (desired - angle + math.pi) % (2 * math.pi) - math.pi
+    angle += diff * 0.25
+    if boost and length > SEGMENT_SPACING * 8:
+        speed = BASE_SPEED * BOOST_MULT
+        length -= BOOST_COST
+    else:
+        speed = BASE_SPEED
+    x = (x + math.cos(angle) * speed) % WORLD_W
+    y = (y + math.sin(angle) * speed) % WORLD_H
+    return x, y, angle, length
+
+
+def _wrap(d, size):
+    return (d + size / 2) % size - size / 2
+
+
+class Predictor:
+    """
+    Moves the local snake's head every tick on the inputs we sent instead
+    of waiting a round trip for the server. Each snapshot's "input" echo
+    ([seq, ticks]) says which of those steps the server has already
+    simulated; the rest are replayed on top of its authoritative head.
+    """
+
+    def __init__(self, tick_rate=TICK_RATE):
+        self.period = 1.0 / tick_rate
+        self.head = None          # predicted (x, y, angle, length)
+        self.sid = None
+        self.steps = deque()      # (input seq, angle, boost) per predicted tick
+        self.path = deque()       # predicted head positions, newest first
+        self.offset = (0.0, 0.0)  # correction still being blended away
+        self._acc = 0.0
+
+    def advance(self, dt, seq, angle, boost):
+        """Run the ticks that fit in `dt` seconds with the input last sent as `seq`."""
+        fade = math.exp(-dt / CORRECTION_TIME)
+        self.offset = (self.offset[0] * fade, self.offset[1] * fade)
+        if self.head is None:
+            return
+        self._acc = min(self._acc + dt, self.period * 4)
+        while self._acc >= self.period:
+            self._acc -= self.period
+            self.head = simulate_head(self.head, angle, boost)
+            self.steps.append((seq, angle, boost))
+            self.path.appendleft(self.head[:2])
+            if len(self.steps) > MAX_PREDICTED:
+                self.steps.popleft()
+                self.path.pop()
+
+    def reconcile(self, player, seq, ticks):
+        """Rewind to the server's head and replay the steps it hasn't simulated yet."""
+        if player.get("sid") != self.sid:
+            self.sid = player.get("sid")
+            self.head = None
+            self.steps.clear()
+        # acks only move forward, older inputs will never be replayed again
+        while self.steps and self.steps[0][0] < seq:
+            self.steps.popleft()
+
+        head = (player["x"], player["y"], player["angle"], player["length"])
+        path = deque()
+        skip = ticks
+        for step_seq, angle, boost in self.steps:
+            if step_seq == seq and skip > 0:
+                skip -= 1
+                continue
+            head = simulate_head(head, angle, boost)
+            path.appendleft(head[:2])
+
+        if self.head is not None:
+            dx = _wrap(self.head[0] + self.offset[0] - head[0], WORLD_W)
+            dy = _wrap(self.head[1] + self.offset[1] - head[1], WORLD_H)
+            self.offset = (dx, dy) if math.hypot(dx, dy) < MAX_CORRECTION else (0.0, 0.0)
+        self.head = head
+        self.path = path
+
+    def position(self):
+        """Where to draw the head: the prediction plus what's left of the last correction."""
+        return ((self.head[0] + self.offset[0]) % WORLD_W,
+                (self.head[1] + self.offset[1]) % WORLD_H)
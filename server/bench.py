@@ -0,0 +1,165 @@
+"""
+Headless benchmark for core.Game.
+
+Builds a Game with N synthetic snakes of a given length, drives them with
+scripted inputs and times every phase of tick() (through the same
+stats.PhaseTimer hook the server uses) plus state(), the JSON payload the
+server sends and packets.compress_packet. Results are printed (or
+written) as JSON so scaling curves can be plotted and compared between
+versions.
+
+    python bench.py --players 1,10,100,1000 --length 100 --ticks 300 --out bench.json
+"""
+
+import argparse
+import json
+import math
+import platform
+import random
+import time
+
+import core
+import packets
+import rooms
+import stats
+from core import WIDTH, HEIGHT, SEGMENT_SPACING, BASE_SPEED
+
+PHASES = ("simulate", "food", "collisions", "deaths", "scores", "tick", "state", "json", "compress")
+
+
+def spawn(game, uid, length):
+    """Add a snake that is already `length` segments long, laid out straight."""
+    game.add_player(uid)
+    s = game.players[uid]
+    s.length_units = s.target_length_units = length * SEGMENT_SPACING
+    s.angle = random.random() * 2 * math.pi
+
+    # oldest sample first so the head ends up at (s.x, s.y)
+    samples = int(s.target_length_units // SEGMENT_SPACING) + 300
+    s.positions.reserve(samples)
+    dx = math.cos(s.angle) * BASE_SPEED
+    dy = math.sin(s.angle) * BASE_SPEED
+    for k in range(samples - 1, -1, -1):
+        s.positions.push((s.x - dx * k) % WIDTH, (s.y - dy * k) % HEIGHT)
+    s.invalidate_segments()
+
+
+def scripted_input(i, t):
+    """Deterministic wandering with short boosts."""
+    return {
+        "angle": math.sin(t / 40 + i) * math.pi + i,
+        "boost": (t + 7 * i) % 120 < 10,
+    }
+
+
+class Samples(list):
+    """Stands in for a stats.Histogram, keeping every observation for exact percentiles."""
+
+    def observe(self, ms):
+        self.append(ms)
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {
+        "p50": ordered[n // 2],
+        "p99": ordered[min(n - 1, int(n * 0.99))],
+        "max": ordered[-1],
+        "mean": sum(ordered) / n,
+    }
+
+
+def run(n_players, length, food, ticks, warmup, engine, respawn):
+    game = rooms.make_game(engine, food)
+    for i in range(n_players):
+        spawn(game, str(i), length)
+
+    timings = {name: Samples() for name in PHASES}
+    # Game.tick() reports its own phases, so the bench can't drift from it
+    game.timer = stats.PhaseTimer(timings)
+    clock = time.perf_counter
+    deaths = 0
+    state_bytes = compressed_bytes = 0
+
+    for t in range(warmup + ticks):
+        if t == warmup:
+            for samples in timings.values():
+                samples.clear()
+        for uid in game.players:
+            game.input(uid, scripted_input(int(uid), t))
+
+        t0 = clock()
+        dead = game.tick()
+        t1 = clock()
+        state = game.state()
+        t2 = clock()
+        payload = json.dumps(state).encode('utf-8')
+        t3 = clock()
+        compressed = packets.compress_packet(state)
+        t4 = clock()
+
+        for name, dt in (("tick", t1 - t0), ("state", t2 - t1), ("json", t3 - t2), ("compress", t4 - t3)):
+            timings[name].observe(dt * 1000)
+        if t >= warmup:
+            deaths += len(dead)
+            state_bytes = len(payload)
+            compressed_bytes = len(compressed)
+
+        if respawn:
+            for uid in dead:
+                spawn(game, uid, length)
+
+    return {
+        "players": n_players,
+        "deaths": deaths,
+        "json_bytes": state_bytes,
+        "compressed_bytes": compressed_bytes,
+        "phases_ms": {name: summarize(samples) for name, samples in timings.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--players", default="1,10,50,100,250,500,1000",
+                        help="comma separated player counts")
+    parser.add_argument("--length", type=int, default=50, help="segments per snake")
+    parser.add_argument("--food", type=int, default=core.FOOD_COUNT)
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--engine", choices=("python", "numpy"), default="python")
+    parser.add_argument("--no-respawn", action="store_true",
+                        help="let dead snakes stay dead instead of keeping N constant")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    report = {
+        "meta": {
+            "engine": args.engine,
+            "length": args.length,
+            "food": args.food,
+            "ticks": args.ticks,
+            "warmup": args.warmup,
+            "respawn": not args.no_respawn,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "results": [],
+    }
+    for n in (int(x) for x in args.players.split(",")):
+        report["results"].append(run(n, args.length, args.food, args.ticks, args.warmup,
+                                     args.engine, not args.no_respawn))
+
+    out = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(out)
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
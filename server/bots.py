@@ -0,0 +1,116 @@
+"""
+Server-side bots: snakes driven straight through Game.input, no sockets.
+
+A BotController keeps `target` bots alive in one Game and, before every
+tick, steers all of them in one NumPy pass:
+
+  - flee the nearest other head within AVOID_RADIUS (boosting when it is
+    very close and the bot can afford it)
+  - otherwise head for the nearest pellet within SEEK_RADIUS
+  - otherwise keep wandering
+
+Bots are ordinary players to the game, so they collide, eat, die, show up
+in snapshots and on the leaderboard; they just never cost a JSON decode or
+a snapshot send. Dead bots are replaced at most SPAWN_PER_TICK per tick.
+Bot uuids start with BOT_PREFIX, which server.py refuses from clients.
+"""
+
+import math
+
+import numpy as np
+
+from core import WIDTH, HEIGHT, SEGMENT_SPACING, wrap_delta
+
+BOT_PREFIX = "bot:"
+SEEK_RADIUS = 600
+AVOID_RADIUS = 120
+PANIC_RADIUS = 50      # boost away from heads this close
+WANDER = 0.05          # radians of random drift per tick when idle
+SPAWN_PER_TICK = 4
+CHUNK = 512            # bots per distance matrix, bounds memory with many bots
+
+
+class BotController:
+    def __init__(self, game, target, prefix=BOT_PREFIX):
+        self.game = game
+        self.target = target
+        self.prefix = prefix
+        self.uids = [f"{prefix}{i}" for i in range(target)]
+        self.rng = np.random.default_rng()
+        self.spawned = 0
+
+    def alive(self):
+        players = self.game.players
+        return [players[uid] for uid in self.uids if uid in players]
+
+    def refill(self):
+        """Add missing bots, a few per tick so a wipe doesn't spike one tick."""
+        players = self.game.players
+        added = 0
+        for uid in self.uids:
+            if added >= SPAWN_PER_TICK:
+                break
+            if uid not in players:
+                self.game.add_player(uid)
+                self.spawned += 1
+                added += 1
+
+    def step(self):
+        """Refill, then steer every bot for the coming tick."""
+        self.refill()
+        players = self.game.players
+        bots = self.alive()
+        if not bots:
+            return
+        # float32 halves the cost of the distance matrices; steering needs no more
+        heads = self.game.heads(bots)
+        others = self.game.heads(list(players.values()))[:, :2]
+        food = np.array([(f.x, f.y) for f in self.game.food], dtype=np.float32).reshape(-1, 2)
+        angle = np.empty(len(bots), dtype=np.float32)
+        boost = np.zeros(len(bots), dtype=bool)
+        for lo in range(0, len(bots), CHUNK):
+            hi = min(lo + CHUNK, len(bots))
+            angle[lo:hi], boost[lo:hi] = self._steer(heads[lo:hi], others, food)
+        for s, a, b in zip(bots, angle.tolist(), boost.tolist()):
+            self.game.input(s.uuid, {"angle": a, "boost": b})
+
+    def _steer(self, heads, others, food):
+        x, y, current, length = heads[:, 0], heads[:, 1], heads[:, 2], heads[:, 3]
+        wander = current + self.rng.uniform(-WANDER, WANDER, len(heads)).astype(np.float32)
+
+        # nearest other head; a bot's own head is at distance 0, skip it
+        near, threat = _nearest(x, y, others)
+        flee = np.arctan2(-wrap_delta(others[near, 1] - y, HEIGHT), -wrap_delta(others[near, 0] - x, WIDTH))
+
+        angle = wander
+        if len(food):
+            nearest, reach = _nearest(x, y, food)
+            seek = np.arctan2(wrap_delta(food[nearest, 1] - y, HEIGHT), wrap_delta(food[nearest, 0] - x, WIDTH))
+            angle = np.where(reach <= SEEK_RADIUS, seek, wander)
+        angle = np.where(threat <= AVOID_RADIUS, flee, angle)
+        # same floor as Snake.simulate, so a short bot doesn't ask for nothing
+        boost = (threat <= PANIC_RADIUS) & (length > SEGMENT_SPACING * 8)
+        return angle % (2 * math.pi), boost
+
+    def stats(self):
+        alive = len(self.alive())
+        # bots only ever leave the game by dying
+        return {"target": self.target, "alive": alive,
+                "spawned": self.spawned, "deaths": self.spawned - alive}
+
+
+def _nearest(x, y, points):
+    """
+    For each (x[i], y[i]), the index of the closest of `points` (n, 2) on the
+    wrap-around world, ignoring points at distance 0, and that distance.
+    Uses min(|d|, size - |d|) per axis, much cheaper than a modulo on big matrices.
+    """
+    dx = np.abs(points[:, 0] - x[:, None])
+    dy = np.abs(points[:, 1] - y[:, None])
+    np.minimum(dx, WIDTH - dx, out=dx)
+    np.minimum(dy, HEIGHT - dy, out=dy)
+    dist = dx * dx
+    dist += dy * dy
+    dist[dist == 0] = np.inf
+    idx = dist.argmin(axis=1)
+    return idx, np.sqrt(dist[np.arange(len(x)), idx])
@@ -2,7 +2,11 @@ import asyncio
 import json
 import uuid
 import math
+import struct
 import pygame
+from delta import DeltaDecoder
+from packets import SNAP_MAGIC, SNAP_VERSIONS, decode_snap
+from fragment import FRAG_MAGIC, DEFAULT_MTU as MTU, Reassembler
 
 SERVER_ADDR = ("127.0.0.1", 9999)
 UUID = str(uuid.uuid4())
@@ -31,24 +35,53 @@ class UDPClient(asyncio.DatagramProtocol):
         self.angle = 0.0
         self.boost = False
         self.state = None
+        self.decoder = DeltaDecoder()
+        self.input_seq = 0  # lets the server drop reordered inputs
+        self.reassembler = Reassembler()
 
     def connection_made(self, transport):
         self.transport = transport
         print(f"[CLIENT] Connected as UUID {UUID}")
 
-        join_pkt = {"type": "JOIN", "uuid": UUID}
+        join_pkt = {"type": "JOIN", "uuid": UUID, "delta": True, "formats": list(SNAP_VERSIONS),
+                    "mtu": MTU}
         self.send(join_pkt)
 
         asyncio.create_task(self.send_input_loop())
 
     def datagram_received(self, data, addr):
-        if b"DEAD" in data:
-            import sys
-            sys.exit(0)
-        try:
-            self.state = json.loads(data.decode("utf-8"))
-        except Exception:
+        if data[:4] == FRAG_MAGIC:
+            try:
+                data = self.reassembler.feed(data)
+            except struct.error:
+                return
+            if data is None:
+                return  # wait for the rest of the frame
+        if data[:4] == SNAP_MAGIC:
+            try:
+                pkt = decode_snap(data)
+            except (ValueError, struct.error):
+                return
+        else:
+            try:
+                pkt = json.loads(data.decode("utf-8"))
+            except Exception:
+                return
+            # by type only: LEADERBOARD and JSON states carry player names, which may contain "DEAD"
+            if pkt.get("type") == "DEAD":
+                import sys
+                sys.exit(0)
+            if pkt.get("type") == "WELCOME":
+                print(f"[CLIENT] Server sends binary snapshots v{pkt['format']}")
+                return
+            if pkt.get("type") != "SNAP":
+                self.state = pkt
+                return
+        state = self.decoder.apply(pkt)
+        if state is None:
             return
+        self.state = state
+        self.send({"type": "ACK", "uuid": UUID, "seq": pkt["seq"]})
         
     def send(self, packet: dict):
         if not self.transport:
@@ -61,8 +94,10 @@ class UDPClient(asyncio.DatagramProtocol):
                 "type": "INPUT",
                 "uuid": UUID,
                 "inp": {"angle": self.angle, "boost": self.boost},
+                "seq": self.input_seq,
             }
             self.send(pkt)
+            self.input_seq += 1
             await asyncio.sleep(0.05)
 
 def get_shortest_diff(target, current, size):
@@ -0,0 +1,157 @@
+"""
+Snapshot codecs and the per-tick encode cache.
+
+Clients pick a codec in JOIN/SPECTATE ("codec": "json" | "tinyscreen").
+Stateless codecs depend only on the state being sent, so each tick every
+(codec, view) pair is encoded exactly once and the bytes are shared by all
+clients that need it. SNAP clients (delta.py / packets.encode_snap) carry
+per-client history, so they are encoded per client but counted here too.
+"""
+
+import json
+import time
+
+import delta
+import fragment
+import overview
+
+try:
+    import packets
+except ImportError:
+    packets = None
+
+
+def _encode_json(state):
+    return json.dumps(state).encode('utf-8')
+
+
+CODECS = {"json": _encode_json}
+if packets:
+    CODECS["tinyscreen"] = packets.compress_packet
+
+DEFAULT_CODEC = "json"
+# Firmware that predates codec negotiation only identifies itself by uuid
+LEGACY_CODECS = {"meowboy": "tinyscreen"}
+
+
+def choose_codec(uid, pkt):
+    codec = pkt.get("codec")
+    if isinstance(codec, str) and codec in CODECS:
+        return codec
+    legacy = LEGACY_CODECS.get(uid)
+    return legacy if legacy in CODECS else DEFAULT_CODEC
+
+
+class SnapshotCache:
+    """
+    Encodes each (codec, view) at most once per tick.
+    `view` is None for the whole world or a Game.state() view tuple.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self._states = {}
+        self._payloads = {}
+        self.counters = {}  # codec -> {"encodes", "shared", "bytes", "encode_s"}
+
+    def begin_tick(self, world=None):
+        """Start a new broadcast, optionally reading from `world` (a Game.freeze() frame) from now on."""
+        if world is not None:
+            self.game = world
+        self._states.clear()
+        self._payloads.clear()
+
+    def _count(self, codec):
+        c = self.counters.get(codec)
+        if c is None:
+            c = self.counters[codec] = {"encodes": 0, "shared": 0, "bytes": 0, "encode_s": 0.0}
+        return c
+
+    def state(self, view):
+        snap = self._states.get(view)
+        if snap is None:
+            snap = self._states[view] = self.game.state(view)
+        return snap
+
+    def get(self, codec, view):
+        key = (codec, view)
+        data = self._payloads.get(key)
+        c = self._count(codec)
+        if data is not None:
+            c["shared"] += 1
+            return data
+        snap = self.state(view)
+        t0 = time.perf_counter()
+        data = self._payloads[key] = CODECS[codec](snap)
+        c["encode_s"] += time.perf_counter() - t0
+        c["encodes"] += 1
+        c["bytes"] += len(data)
+        return data
+
+    def parts(self, view, mtu, seq):
+        """The JSON state for `view` as PART datagrams that fit `mtu` (fragment.split_state)."""
+        key = ("json-part", view, mtu)
+        datagrams = self._payloads.get(key)
+        c = self._count("json-part")
+        if datagrams is not None:
+            c["shared"] += 1
+            return datagrams
+        snap = self.state(view)
+        t0 = time.perf_counter()
+        datagrams = self._payloads[key] = fragment.split_state(snap, seq, mtu)
+        c["encode_s"] += time.perf_counter() - t0
+        c["encodes"] += 1
+        c["bytes"] += sum(len(d) for d in datagrams)
+        return datagrams
+
+    def overview(self, stride, food, mtu, seq):
+        """The spectator overview (overview.build) as datagrams, PART-split when `mtu` is set."""
+        key = ("overview", stride, food, mtu)
+        datagrams = self._payloads.get(key)
+        c = self._count("overview")
+        if datagrams is not None:
+            c["shared"] += 1
+            return datagrams
+        t0 = time.perf_counter()
+        state_key = ("overview", stride, food)
+        snap = self._states.get(state_key)
+        if snap is None:
+            snap = self._states[state_key] = overview.build(self.game, stride, food)
+        if mtu:
+            datagrams = fragment.split_state(snap, seq, mtu)
+        else:
+            datagrams = [json.dumps(snap).encode('utf-8')]
+        self._payloads[key] = datagrams
+        c["encode_s"] += time.perf_counter() - t0
+        c["encodes"] += 1
+        c["bytes"] += sum(len(d) for d in datagrams)
+        return datagrams
+
+    def snap(self, encoder, fmt, view, echo=None):
+        """
+        Per-client SNAP message (delta or full), JSON or binary format `fmt`.
+        `echo` is the client's [last applied input seq, ticks simulated since].
+        """
+        codec = "snap-json" if fmt is None else "snap-v%d" % fmt
+        c = self._count(codec)
+        t0 = time.perf_counter()
+        msg = encoder.encode(delta.capture(self.game, view))
+        if echo is not None:
+            msg["input"] = echo
+        data = json.dumps(msg).encode('utf-8') if fmt is None else packets.encode_snap(msg, fmt)
+        c["encode_s"] += time.perf_counter() - t0
+        c["encodes"] += 1
+        c["bytes"] += len(data)
+        return data
+
+    def stats(self):
+        # runs on the event loop while the sender thread may add codecs
+        return {
+            codec: {
+                "encodes": c["encodes"],
+                "shared": c["shared"],
+                "bytes": c["bytes"],
+                "encode_ms_avg": c["encode_s"] * 1000 / c["encodes"] if c["encodes"] else 0.0,
+            }
+            for codec, c in list(self.counters.items())
+        }
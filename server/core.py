@@ -14,9 +14,14 @@ You can add/remove snakes dynamically by calling `Game.add_player(uuid)` and
 Coordinate system: world is WIDTH × HEIGHT with wrap-around.
 """
 
+import bisect
+import itertools
 import math
 import random
-from collections import deque
+
+import numpy as np
+
+from stats import NULL_TIMER
 
 # ================= CONFIG =================
 WIDTH, HEIGHT = 3000, 3000
@@ -27,8 +32,13 @@ BOOST_COST = 0.09
 INITIAL_LENGTH = 10
 GROW_PER_FOOD = 1
 FOOD_COUNT = 50
+COLLISION_RADIUS = 8
+HASH_CELL = 25  # must divide WIDTH and HEIGHT
+FOOD_CELL = 50  # must divide WIDTH and HEIGHT
 # ==========================================
 
+_WORLD = np.array((WIDTH, HEIGHT), dtype=np.float64)
+
 
 def wrap_pos(v, maxv):
     if v < 0:
@@ -41,12 +51,75 @@ def wrap_pos(v, maxv):
 def distance(a, b):
     return math.hypot(a[0] - b[0], a[1] - b[1])
 
+
+def wrap_delta(d, size):
+    """Shortest signed offset on a ring of `size` (works on arrays too)."""
+    return (d + size / 2) % size - size / 2
+
+
+def _span_overlaps(lo, hi, half, size):
+    # also try the images one world away, for bodies longer than half the world
+    for shift in (0, -size, size):
+        if lo + shift <= half and hi + shift >= -half:
+            return True
+    return False
+
+# ==========================================
+# SPATIAL HASH
+# ==========================================
+
+class SpatialHash:
+    """
+    Uniform grid over the wrap-around world.
+
+    Buckets hold (owner, x, y) entries. Queries wrap across the world edge,
+    the caller still decides which distance metric counts as a hit.
+    """
+    def __init__(self, cell=HASH_CELL):
+        self.cell = cell
+        self.cols = WIDTH // cell
+        self.rows = HEIGHT // cell
+        self.buckets = {}
+
+    def clear(self):
+        self.buckets.clear()
+
+    def insert(self, owner, x, y):
+        key = (int(x // self.cell) % self.cols, int(y // self.cell) % self.rows)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            self.buckets[key] = [(owner, x, y)]
+        else:
+            bucket.append((owner, x, y))
+
+    def query(self, x, y, radius):
+        """Yield every entry in the cells overlapping the square around (x, y)."""
+        c0, c1 = int((x - radius) // self.cell), int((x + radius) // self.cell)
+        r0, r1 = int((y - radius) // self.cell), int((y + radius) // self.cell)
+        for cx in range(c0, c1 + 1):
+            for cy in range(r0, r1 + 1):
+                bucket = self.buckets.get((cx % self.cols, cy % self.rows))
+                if bucket:
+                    yield from bucket
+
+    def hit(self, x, y, radius, exclude=None):
+        """True if an entry not owned by `exclude` is closer than `radius`."""
+        for owner, px, py in self.query(x, y, radius):
+            if owner is not exclude and distance((x, y), (px, py)) < radius:
+                return True
+        return False
+
 # ==========================================
 # FOOD
 # ==========================================
 
+_food_ids = itertools.count()
+_snake_ids = itertools.count()
+
+
 class Food:
     def __init__(self, x=None, y=None):
+        self.id = next(_food_ids)
         self.x = x if x is not None else random.random() * WIDTH
         self.y = y if y is not None else random.random() * HEIGHT
         self.size = random.randint(3, 6)
@@ -54,6 +127,152 @@ class Food:
     def as_dict(self):
         return {"x": self.x, "y": self.y, "size": self.size}
 
+
+class FoodGrid:
+    """
+    Food bucketed by cell over the wrap-around world.
+
+    Each bucket is a dict used as an ordered set, so add/remove are O(1).
+    Iterating the grid yields every pellet.
+    """
+    def __init__(self, cell=FOOD_CELL):
+        self.cell = cell
+        self.cols = WIDTH // cell
+        self.rows = HEIGHT // cell
+        self.buckets = {}
+        self.count = 0
+
+    def _key(self, x, y):
+        return (int(x // self.cell) % self.cols, int(y // self.cell) % self.rows)
+
+    def add(self, f):
+        key = self._key(f.x, f.y)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = {}
+        bucket[f] = None
+        self.count += 1
+
+    def remove(self, f):
+        key = self._key(f.x, f.y)
+        bucket = self.buckets[key]
+        del bucket[f]
+        if not bucket:
+            del self.buckets[key]
+        self.count -= 1
+
+    def near(self, x, y, radius):
+        """Return the pellets in the cells overlapping the square around (x, y)."""
+        out = []
+        c0, c1 = int((x - radius) // self.cell), int((x + radius) // self.cell)
+        r0, r1 = int((y - radius) // self.cell), int((y + radius) // self.cell)
+        for cx in range(c0, c1 + 1):
+            for cy in range(r0, r1 + 1):
+                bucket = self.buckets.get((cx % self.cols, cy % self.rows))
+                if bucket:
+                    out.extend(bucket)
+        return out
+
+    def in_rect(self, cx, cy, half_w, half_h):
+        """Return the pellets within the wrap-around rectangle centred on (cx, cy)."""
+        out = []
+        c0 = int((cx - half_w) // self.cell)
+        r0 = int((cy - half_h) // self.cell)
+        cols = min(int((cx + half_w) // self.cell) - c0 + 1, self.cols)
+        rows = min(int((cy + half_h) // self.cell) - r0 + 1, self.rows)
+        for col in range(c0, c0 + cols):
+            for row in range(r0, r0 + rows):
+                bucket = self.buckets.get((col % self.cols, row % self.rows))
+                if not bucket:
+                    continue
+                for f in bucket:
+                    if (abs(wrap_delta(f.x - cx, WIDTH)) <= half_w
+                            and abs(wrap_delta(f.y - cy, HEIGHT)) <= half_h):
+                        out.append(f)
+        return out
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for bucket in self.buckets.values():
+            yield from bucket
+
+    def copy(self):
+        """A grid with the same pellets that later add/remove calls don't touch."""
+        grid = FoodGrid(self.cell)
+        grid.buckets = {key: dict(bucket) for key, bucket in self.buckets.items()}
+        grid.count = self.count
+        return grid
+
+# ==========================================
+# POSITION HISTORY
+# ==========================================
+
+class PositionRing:
+    """
+    Head-first position history in a preallocated float32 ring buffer.
+
+    Each sample is written twice, at `i` and `i + capacity`, so the newest
+    `len(ring)` samples are always one contiguous block of `buf` and any
+    stride over them is a zero-copy view. The buffer doubles when a snake
+    needs more history than it can hold. push() writes through a flat
+    memoryview, a lot cheaper per sample than NumPy item assignment.
+    """
+    def __init__(self, x, y, count, capacity):
+        self.capacity = max(count, capacity)
+        self.buf = np.empty((2 * self.capacity, 2), dtype=np.float32)
+        self.buf[:] = (x, y)
+        self._flat = memoryview(self.buf.reshape(-1))
+        self.head = 0
+        self.count = count
+        self.total = count  # samples ever written; the newest has id total - 1
+
+    def __len__(self):
+        return self.count
+
+    def reserve(self, n):
+        if n <= self.capacity:
+            return
+        new_cap = max(n, 2 * self.capacity)
+        buf = np.empty((2 * new_cap, 2), dtype=np.float32)
+        window = self.buf[self.head:self.head + self.count]
+        buf[:self.count] = window
+        buf[new_cap:new_cap + self.count] = window
+        self.buf = buf
+        self._flat = memoryview(buf.reshape(-1))
+        self.capacity = new_cap
+        self.head = 0
+
+    def push(self, x, y):
+        """Add a new head sample. Drops the oldest one if the ring is full."""
+        h = (self.head - 1) % self.capacity
+        flat = self._flat
+        flat[2 * h] = flat[2 * (h + self.capacity)] = x
+        flat[2 * h + 1] = flat[2 * (h + self.capacity) + 1] = y
+        self.head = h
+        self.total += 1
+        if self.count < self.capacity:
+            self.count += 1
+
+    def trim(self, n):
+        if self.count > n:
+            self.count = n
+
+    def strided(self, step, limit):
+        """View of every `step`-th sample from the head, at most `limit` rows."""
+        return self.buf[self.head:self.head + self.count:step][:limit]
+
+    def anchored(self, step, limit):
+        """
+        Like strided(), but only samples whose id is a multiple of `step`, so
+        a given row keeps its id from tick to tick.
+        Returns: (id of the first row, view).
+        """
+        off = (self.total - 1) % step
+        start = self.head + off
+        return self.total - 1 - off, self.buf[start:self.head + self.count:step][:limit]
+
 # ==========================================
 # SNAKE
 # ==========================================
@@ -61,6 +280,7 @@ class Food:
 class Snake:
     def __init__(self, uuid, x=None, y=None):
         self.uuid = uuid
+        self.serial = next(_snake_ids)  # tells a respawn apart from the old snake
         self.x = x if x is not None else random.random() * WIDTH
         self.y = y if y is not None else random.random() * HEIGHT
 
@@ -73,12 +293,17 @@ class Snake:
 
         self.pending_input = {}
 
-        self.positions = deque()
-        for _ in range(int(self.length_units // SEGMENT_SPACING) + 200):
-            self.positions.appendleft((self.x, self.y))
+        self.positions = PositionRing(
+            self.x, self.y,
+            int(self.length_units // SEGMENT_SPACING) + 200,
+            int(self.target_length_units // SEGMENT_SPACING) + 300,
+        )
 
         self.dead = False
 
+        # per-tick segment cache, see segments()
+        self.invalidate_segments()
+
     # called by Game when Game.input(uuid) happens
     def apply_input(self, inp):
         if "angle" in inp:
@@ -86,7 +311,15 @@ class Snake:
         if "boost" in inp:
             self.pending_input["boost"] = bool(inp["boost"])
     
+    def invalidate_segments(self):
+        self._seg_count = None
+        self._segments = None
+        self._segment_list = None
+        self._bounds = None
+        self._trail = None
+
     def simulate(self):
+        self.invalidate_segments()
         if "angle" in self.pending_input:
             desired = self.pending_input["angle"]
             diff = (desired - self.angle + math.pi) % (2 * math.pi) - math.pi
@@ -104,10 +337,10 @@ class Snake:
         dy = math.sin(self.angle) * self.speed
         self.x = wrap_pos(self.x + dx, WIDTH)
         self.y = wrap_pos(self.y + dy, HEIGHT)
-        self.positions.appendleft((self.x, self.y))
         max_positions = int(self.target_length_units // SEGMENT_SPACING) + 300
-        while len(self.positions) > max_positions:
-            self.positions.pop()
+        self.positions.reserve(max_positions)
+        self.positions.push(self.x, self.y)
+        self.positions.trim(max_positions)
 
         # adjust length gradually
         if self.length_units < self.target_length_units:
@@ -115,15 +348,70 @@ class Snake:
         elif self.length_units > self.target_length_units:
             self.length_units -= 0.6
 
+    def score(self):
+        """Body length in segments, as ranked on the leaderboard."""
+        return max(3, int(self.length_units // SEGMENT_SPACING))
+
     def segments(self):
+        """
+        Every SEGMENT_SPACING-th position from the head as an (n, 2) float32
+        view into the ring buffer. Only valid until the next simulate().
+
+        Computed once per tick; the cache is dropped by simulate() and
+        whenever the length maps to a different segment count.
+        """
         seg_count = max(3, int(self.length_units // SEGMENT_SPACING))
-        out = []
-        for i in range(seg_count):
-            idx = i * SEGMENT_SPACING
-            if idx >= len(self.positions):
-                break
-            out.append(self.positions[idx])
-        return out
+        if seg_count != self._seg_count:
+            self._seg_count = seg_count
+            self._segments = self.positions.strided(SEGMENT_SPACING, seg_count)
+            self._segment_list = None
+            self._bounds = None
+            self._trail = None
+        return self._segments
+
+    def segment_list(self):
+        """segments() as a cached list of [x, y] Python floats."""
+        segs = self.segments()
+        if self._segment_list is None:
+            self._segment_list = segs.tolist()
+        return self._segment_list
+
+    def trail(self):
+        """
+        Body sampled at fixed position ids instead of fixed offsets from the
+        head: between ticks existing points keep their id, new ones appear at
+        the front and old ones drop off the back. Used for delta snapshots.
+        Returns: (id of the first point, list of [x, y]). Cached per tick.
+        """
+        if self._trail is None:
+            seg_count = max(3, int(self.length_units // SEGMENT_SPACING))
+            first_id, view = self.positions.anchored(SEGMENT_SPACING, seg_count)
+            self._trail = (first_id, view.tolist())
+        return self._trail
+
+    def bounds(self):
+        """
+        Extent of the head and body relative to the head, unwrapped across
+        the world edge: (min_dx, max_dx, min_dy, max_dy). Cached with segments().
+        """
+        segs = self.segments()
+        if self._bounds is None:
+            pts = np.empty((len(segs) + 1, 2))
+            pts[0] = (self.x, self.y)
+            pts[1:] = segs
+            rel = np.cumsum(wrap_delta(np.diff(pts, axis=0), _WORLD), axis=0)
+            lo = rel.min(axis=0, initial=0.0)
+            hi = rel.max(axis=0, initial=0.0)
+            self._bounds = (lo[0].item(), hi[0].item(), lo[1].item(), hi[1].item())
+        return self._bounds
+
+    def overlaps(self, cx, cy, half_w, half_h):
+        """True if any part of the snake lies in the rectangle centred on (cx, cy)."""
+        min_dx, max_dx, min_dy, max_dy = self.bounds()
+        dx = wrap_delta(self.x - cx, WIDTH)
+        dy = wrap_delta(self.y - cy, HEIGHT)
+        return (_span_overlaps(dx + min_dx, dx + max_dx, half_w, WIDTH)
+                and _span_overlaps(dy + min_dy, dy + max_dy, half_h, HEIGHT))
 
     def as_dict(self):
         return {
@@ -133,94 +421,229 @@ class Snake:
             "angle": self.angle,
             "boost": self.boosting,
             "length": self.length_units,
-            "segments": list(self.segments()),
+            "segments": self.segment_list(),
         }
 
+
+class SnakeFrame(Snake):
+    """
+    Read-only copy of a snake as it was at the end of a tick. Owns its body
+    arrays, so snapshots can be encoded from it on another thread while the
+    game keeps simulating. Only the read side of Snake (segments, trail,
+    bounds, overlaps, as_dict) is meant to be used.
+    """
+    def __init__(self, s):
+        self.uuid = s.uuid
+        self.serial = s.serial
+        self.x, self.y = s.x, s.y
+        self.angle = s.angle
+        self.boosting = s.boosting
+        self.length_units = s.length_units
+        self.dead = s.dead
+        # reuse whatever the live snake already built this tick; the lists are
+        # replaced, never mutated, so sharing them is safe
+        self._segments = s.segments().copy()
+        self._seg_count = s._seg_count
+        self._segment_list = s._segment_list
+        self._bounds = s._bounds
+        if s._trail is not None:
+            self._trail, self._trail_view = s._trail, None
+        else:
+            first_id, view = s.positions.anchored(SEGMENT_SPACING, s._seg_count)
+            self._trail, self._trail_view = None, (first_id, view.copy())
+
+    def segments(self):
+        return self._segments
+
+    def trail(self):
+        if self._trail is None:
+            first_id, view = self._trail_view
+            self._trail = (first_id, view.tolist())
+        return self._trail
+
+# ==========================================
+# LEADERBOARD
+# ==========================================
+
+class Leaderboard:
+    """
+    Scores kept sorted as they change. A score is the body length in
+    segments, which only moves every few ticks, so an update is a dict
+    lookup most of the time and a bisect remove/insert otherwise.
+    """
+    def __init__(self):
+        self.scores = {}   # uuid -> score
+        self.ranked = []   # (-score, uuid), best first
+
+    def update(self, uuid, score):
+        old = self.scores.get(uuid)
+        if old == score:
+            return
+        if old is not None:
+            del self.ranked[bisect.bisect_left(self.ranked, (-old, uuid))]
+        self.scores[uuid] = score
+        bisect.insort(self.ranked, (-score, uuid))
+
+    def remove(self, uuid):
+        old = self.scores.pop(uuid, None)
+        if old is not None:
+            del self.ranked[bisect.bisect_left(self.ranked, (-old, uuid))]
+
+    def top(self, n):
+        """The n best as [[uuid, score], ...]."""
+        return [[uuid, -neg] for neg, uuid in self.ranked[:n]]
+
+    def rank(self, uuid):
+        """1-based rank of `uuid`, or None if it has no score."""
+        score = self.scores.get(uuid)
+        if score is None:
+            return None
+        return bisect.bisect_left(self.ranked, (-score, uuid)) + 1
+
+    def __len__(self):
+        return len(self.ranked)
+
 # ==========================================
 # GAME
 # ==========================================
 
 class Game:
-    def __init__(self):
+    def __init__(self, food_count=FOOD_COUNT):
         self.players = {}  # uuid -> Snake
-        self.food = [Food() for _ in range(FOOD_COUNT)]
+        self.food_count = food_count
+        self.food = FoodGrid()
+        for _ in range(food_count):
+            self.food.add(Food())
+        self.grid = SpatialHash()
+        self.leaderboard = Leaderboard()
+        # stats.PhaseTimer to time tick() phases; the server's rooms set one
+        self.timer = NULL_TIMER
 
     def add_player(self, uuid):
         if uuid not in self.players:
             self.players[uuid] = Snake(uuid)
+            self.leaderboard.update(uuid, self.players[uuid].score())
 
     def remove_player(self, uuid):
         if uuid in self.players:
             del self.players[uuid]
+            self.leaderboard.remove(uuid)
 
     def input(self, uuid, inp):
         if uuid in self.players:
             self.players[uuid].apply_input(inp)
 
+    def _simulate(self):
+        for s in list(self.players.values()):
+            if not s.dead:
+                s.simulate()
+
     def tick(self):
         """
         Advance game by 1 tick.
         Returns: list of UUIDs that died this tick.
         """
-        dead_uuids = []
-
-        for s in list(self.players.values()):
-            if not s.dead:
-                s.simulate()
-
+        timer = self.timer
+        timer.start()
+        self._simulate()
+        timer.mark("simulate")
+        self._eat_food()
+        timer.mark("food")
+        self._collide()
+        timer.mark("collisions")
+        dead = self._process_deaths()
+        timer.mark("deaths")
+        self._update_scores()
+        timer.mark("scores")
+        return dead
+
+    def _update_scores(self):
+        update = self.leaderboard.update
+        for uuid, s in self.players.items():
+            update(uuid, s.score())
+
+    def _eat_food(self):
         for s in list(self.players.values()):
             if s.dead: continue
             eaten = []
-            for f in self.food:
-                # Collision radius for food
-                if distance((s.x, s.y), (f.x, f.y)) <= (s.speed + 10): 
+            # Collision radius for food
+            radius = s.speed + 10
+            for f in self.food.near(s.x, s.y, radius):
+                if distance((s.x, s.y), (f.x, f.y)) <= radius:
                     eaten.append(f)
             for f in eaten:
                 self.food.remove(f)
                 s.target_length_units += GROW_PER_FOOD * SEGMENT_SPACING
 
         # Respawn food
-        while len(self.food) < FOOD_COUNT:
-            self.food.append(Food())
-
-        # 3. Snake Collisions
-        all_snakes = list(self.players.values())
-        for a in all_snakes:
+        while len(self.food) < self.food_count:
+            self.food.add(Food())
+
+    def _collide(self):
+        # Every body goes into the hash once, then each head only looks at
+        # the cells around it instead of every segment of every other snake.
+        self.grid.clear()
+        for b in self.players.values():
+            for (x, y) in b.segment_list():
+                self.grid.insert(b, x, y)
+
+        for a in self.players.values():
             if a.dead: continue
-            
-            head = (a.x, a.y)
-            
-            for b in all_snakes:
-                if a is b: 
-                    continue
+            if self.grid.hit(a.x, a.y, COLLISION_RADIUS, exclude=a):
+                a.dead = True
 
-                segs = b.segments()
-                
-                for pos in segs:
-                    if distance(head, pos) < 8: 
-                        a.dead = True
-                        break
-                
-                if a.dead:
-                    break
-
-        # 4. Process Deaths
+    def _process_deaths(self):
+        dead_uuids = []
         for s in list(self.players.values()):
             if s.dead:
                 dead_uuids.append(s.uuid)
                 
                 # Turn dead snake body into food
-                segs = s.segments()
+                segs = s.segment_list()
                 # Drop food every few segments so it's not too dense
-                for (x, y) in segs[::4]: 
-                    self.food.append(Food(x, y))
+                for (x, y) in segs[::4]:
+                    self.food.add(Food(x, y))
                 
                 self.remove_player(s.uuid)
 
         return dead_uuids
 
-    def state(self):
+    def heads(self, snakes):
+        """(n, 4) float32 array of x, y, angle, length_units of `snakes`, for batched steering."""
+        return np.array([(s.x, s.y, s.angle, s.length_units) for s in snakes],
+                        dtype=np.float32).reshape(-1, 4)
+
+    def freeze(self):
+        """Read-only copy of the players and food for encoding off the simulation thread."""
+        return GameFrame(self)
+
+    def state(self, view=None):
+        """
+        Snapshot of the world. With view=(cx, cy, half_w, half_h) only the
+        snakes overlapping that wrap-around rectangle and the food inside it
+        are included.
+        """
+        if view is None:
+            return {
+                "players": {uuid: s.as_dict() for uuid, s in self.players.items()},
+                "food": [f.as_dict() for f in self.food],
+            }
+        cx, cy, half_w, half_h = view
         return {
-            "players": {uuid: s.as_dict() for uuid, s in self.players.items()},
-            "food": [f.as_dict() for f in self.food],
+            "players": {uuid: s.as_dict() for uuid, s in self.players.items()
+                        if s.overlaps(cx, cy, half_w, half_h)},
+            "food": [f.as_dict() for f in self.food.in_rect(cx, cy, half_w, half_h)],
         }
+
+
+class GameFrame:
+    """
+    A Game frozen between ticks (see Game.freeze). Has the `players`,
+    `food` and `state()` that snapshot encoders read.
+    """
+    def __init__(self, game):
+        self.players = {uid: SnakeFrame(s) for uid, s in game.players.items()}
+        self.food = game.food.copy()
+
+    def state(self, view=None):
+        return Game.state(self, view)
@@ -0,0 +1,207 @@
+"""
+Delta-compressed snapshots against per-client acknowledged baselines.
+
+A client that JOINs with "delta": true gets SNAP messages instead of the
+plain state dict and answers each one it could decode with
+{"type": "ACK", "uuid": ..., "seq": n}. The server keeps the last HISTORY
+snapshots it sent that client and encodes every new one against the newest
+acked baseline still in that history:
+
+  - food: ids added (with x, y, size) and ids removed
+  - snakes: head fields always, plus the body change as points pushed at
+    the front, how many old points are kept, and points revealed at the tail
+
+Bodies use Snake.trail(), which samples the position history at fixed ids,
+so between ticks only a point or two changes at either end. If nothing has
+been acked recently (loss) the baseline falls out of history and the next
+message is a full snapshot again.
+
+Wire format (JSON):
+  full:  {"type": "SNAP", "seq": n,
+          "players": {uuid: PLAYER}, "food": [[id, x, y, size], ...]}
+  delta: {"type": "SNAP", "seq": n, "base": b,
+          "players": {uuid: PLAYER or CHANGE},
+          "food_add": [[id, x, y, size], ...], "food_del": [id, ...]}
+  PLAYER = {"sid", "x", "y", "angle", "boost", "length", "h", "segments"}
+  CHANGE = {"x", "y", "angle", "boost", "length", "h", "push", "keep"[, "tail"]}
+Every snake in the snapshot has an entry; a snake missing from "players"
+is gone. "h" is the id of the first body point. Players' own snapshots
+also carry "input": [seq, ticks], the newest input the server applied and
+how many ticks it has simulated since, for client-side prediction.
+"""
+
+from collections import OrderedDict, deque
+
+from core import SEGMENT_SPACING
+
+HISTORY = 32
+
+
+def capture(game, view=None):
+    """
+    The world (or the part inside `view`) in the keyed form deltas work on.
+    Returns: (players, food) with players[uuid] = (sid, x, y, angle, boost,
+    length, first_id, segments) and food[id] = (x, y, size).
+    """
+    players = {}
+    for uid, s in game.players.items():
+        if view is not None and not s.overlaps(*view):
+            continue
+        first_id, segs = s.trail()
+        players[uid] = (s.serial, s.x, s.y, s.angle, s.boosting, s.length_units, first_id, segs)
+    food_src = game.food if view is None else game.food.in_rect(*view)
+    food = {f.id: (f.x, f.y, f.size) for f in food_src}
+    return players, food
+
+
+def _player_full(p):
+    sid, x, y, angle, boost, length, first_id, segs = p
+    return {"sid": sid, "x": x, "y": y, "angle": angle, "boost": boost,
+            "length": length, "h": first_id, "segments": segs}
+
+
+def _player_change(old, new):
+    if old[0] != new[0]:
+        return _player_full(new)
+    h0, segs0 = old[6], old[7]
+    h1, segs1 = new[6], new[7]
+    pushed = (h1 - h0) // SEGMENT_SPACING
+    if pushed < 0 or pushed >= len(segs1):
+        return _player_full(new)
+
+    # new body = segs1[:pushed] + segs0[:keep] + tail
+    remaining = len(segs1) - pushed
+    keep = min(remaining, len(segs0))
+    entry = {"x": new[1], "y": new[2], "angle": new[3], "boost": new[4],
+             "length": new[5], "h": h1, "push": segs1[:pushed], "keep": keep}
+    if remaining > keep:
+        entry["tail"] = segs1[pushed + keep:]
+    return entry
+
+
+def full_message(seq, snap):
+    players, food = snap
+    return {
+        "type": "SNAP",
+        "seq": seq,
+        "players": {uid: _player_full(p) for uid, p in players.items()},
+        "food": [[fid, x, y, size] for fid, (x, y, size) in food.items()],
+    }
+
+
+def delta_message(seq, base_seq, base, snap):
+    base_players, base_food = base
+    players, food = snap
+    out = {}
+    for uid, p in players.items():
+        old = base_players.get(uid)
+        out[uid] = _player_full(p) if old is None else _player_change(old, p)
+    return {
+        "type": "SNAP",
+        "seq": seq,
+        "base": base_seq,
+        "players": out,
+        "food_add": [[fid, x, y, size] for fid, (x, y, size) in food.items()
+                     if fid not in base_food],
+        "food_del": [fid for fid in base_food if fid not in food],
+    }
+
+
+class DeltaEncoder:
+    """
+    Per-client snapshot history and baseline tracking (server side).
+    ack() may be called from the network thread while encode() runs on the
+    broadcast thread: acks are queued and applied at the next encode.
+    """
+
+    def __init__(self, history=HISTORY):
+        self.history_len = history
+        self.history = OrderedDict()  # seq -> snapshot from capture()
+        self.seq = 0
+        self.acked = None
+        self.fulls = 0
+        self.deltas = 0
+        self._acks = deque()
+
+    def ack(self, seq):
+        self._acks.append(seq)
+
+    def _apply_ack(self, seq):
+        if seq not in self.history or (self.acked is not None and seq <= self.acked):
+            return
+        self.acked = seq
+        # acks only move forward, so older snapshots can never be a baseline again
+        while next(iter(self.history)) != seq:
+            self.history.popitem(last=False)
+
+    def encode(self, snap):
+        while self._acks:
+            self._apply_ack(self._acks.popleft())
+        self.seq += 1
+        base = self.history.get(self.acked)
+        if base is None:
+            msg = full_message(self.seq, snap)
+            self.fulls += 1
+        else:
+            msg = delta_message(self.seq, self.acked, base, snap)
+            self.deltas += 1
+        self.history[self.seq] = snap
+        while len(self.history) > self.history_len:
+            self.history.popitem(last=False)
+        return msg
+
+
+class DeltaDecoder:
+    """Client side: rebuilds states from SNAP messages. Mirrored in client/netcode.py."""
+
+    def __init__(self, history=HISTORY):
+        self.history_len = history
+        self.states = OrderedDict()  # seq -> (players, food)
+        self.last_seq = 0
+
+    def apply(self, msg):
+        """
+        Returns: state dict in the usual {"players", "food"} shape, or None if
+        the message's baseline is unknown (it must then not be acked).
+        """
+        seq = msg["seq"]
+        if seq <= self.last_seq:
+            return None  # reordered, we already have something newer
+        if "base" not in msg:
+            players = msg["players"]
+            food = {fid: (x, y, size) for fid, x, y, size in msg["food"]}
+        else:
+            base = self.states.get(msg["base"])
+            if base is None:
+                return None
+            base_players, base_food = base
+            players = {}
+            for uid, e in msg["players"].items():
+                if "segments" in e:
+                    players[uid] = e
+                    continue
+                old = base_players.get(uid)
+                if old is None:
+                    return None
+                e["sid"] = old["sid"]
+                e["segments"] = e.pop("push") + old["segments"][:e.pop("keep")] + e.pop("tail", [])
+                players[uid] = e
+            food = dict(base_food)
+            for fid in msg["food_del"]:
+                food.pop(fid, None)
+            for fid, x, y, size in msg["food_add"]:
+                food[fid] = (x, y, size)
+            # the server never goes back to an older baseline
+            while next(iter(self.states)) != msg["base"]:
+                self.states.popitem(last=False)
+
+        self.last_seq = seq
+        self.states[seq] = (players, food)
+        while len(self.states) > self.history_len:
+            self.states.popitem(last=False)
+        # trail points can lag the head by a few samples, so draw from the head
+        return {
+            "players": {uid: dict(e, segments=[[e["x"], e["y"]]] + e["segments"])
+                        for uid, e in players.items()},
+            "food": [{"x": x, "y": y, "size": size} for x, y, size in food.values()],
+        }
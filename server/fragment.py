@@ -0,0 +1,227 @@
+"""
+MTU-aware snapshot fragmentation and reassembly.
+
+A client that JOINs/SPECTATEs with "mtu": <bytes> never gets a datagram
+larger than that (minus IP/UDP headers). Two strategies:
+
+  - FRAG: any payload (SNAP, TinyScreen, ...) is cut into numbered chunks
+      "FRAG", u32 frame, u16 index, u16 count, chunk bytes
+    and the receiver rebuilds it with Reassembler. An incomplete frame is
+    dropped as soon as a newer one completes.
+
+  - PART: a JSON state is split into self-contained partial snapshots
+      {"type": "PART", "seq", "part", "parts", "players", "food"}
+    where a long snake may be cut into segment ranges ("seg_offset",
+    "seg_total"). PartAssembler merges whatever arrived, so losing one
+    datagram only loses part of the frame. A snake head too big for one
+    datagram (a long uuid at a small mtu) sends the whole state as a single
+    PART cut into FRAG chunks instead, so PART receivers reassemble FRAG too.
+"""
+
+import bisect
+import itertools
+import json
+import struct
+
+FRAG_MAGIC = b'FRAG'
+FRAG_HEADER = struct.Struct("<4sIHH")
+DEFAULT_MTU = 1200
+MIN_MTU = 576
+MAX_DATAGRAM = 65507
+UDP_OVERHEAD = 28          # IPv4 + UDP headers
+MAX_PENDING = 4
+
+
+def clamp_mtu(mtu):
+    if not isinstance(mtu, int):
+        return None
+    return max(MIN_MTU, min(mtu, MAX_DATAGRAM + UDP_OVERHEAD))
+
+
+def fragment(data, frame, mtu):
+    """Split `data` into FRAG datagrams that fit `mtu`. Small payloads go out as is."""
+    limit = mtu - UDP_OVERHEAD
+    if len(data) <= limit:
+        return [data]
+    chunk = limit - FRAG_HEADER.size
+    count = (len(data) + chunk - 1) // chunk
+    view = memoryview(data)
+    return [FRAG_HEADER.pack(FRAG_MAGIC, frame & 0xffffffff, i, count) + view[i * chunk:(i + 1) * chunk]
+            for i in range(count)]
+
+
+def _texts(items):
+    """
+    The JSON text of every element of `items`, cut out of one json.dumps of
+    the list. Elements are flat (body points, pellets); anything that doesn't
+    cut cleanly is encoded one by one.
+    """
+    if not items:
+        return []
+    text = json.dumps(items)
+    opener = text[1]
+    closer = {"[": "]", "{": "}"}.get(opener)
+    if closer is not None:
+        texts = text[2:-2].split(closer + ", " + opener)
+        if len(texts) == len(items):
+            return [opener + t + closer for t in texts]
+    return [json.dumps(item) for item in items]
+
+
+def split_state(state, seq, mtu):
+    """
+    Split a Game.state() dict into PART datagrams that each fit `mtu`.
+    Every body point and pellet is encoded once and the parts are filled
+    against those exact sizes, then joined into the datagrams as is.
+    Returns: list of encoded datagrams.
+    """
+    players_in, food_in = state.get("players", {}), state.get("food", [])
+    # a part carries at least one entry, so this many digits always fit "part" and "parts"
+    entries = len(players_in) + len(food_in) + sum(len(p["segments"]) for p in players_in.values())
+    digits = len(str(entries))
+    envelope = f'{{"type": "PART", "seq": {json.dumps(seq)}, "part": %d, "parts": %d, "players": {{%s}}, "food": [%s]}}'
+    budget = mtu - UDP_OVERHEAD - (len(envelope % (0, 0, "", "")) + 2 * (digits - 1))
+    parts = []
+    players, food, used = [], [], 0
+
+    def flush():
+        nonlocal players, food, used
+        if players or food:
+            parts.append((players, food))
+        players, food, used = [], [], 0
+
+    for uid, p in players_in.items():
+        key = json.dumps(uid) + ": "
+        # the player's other fields, open for more: '{"uuid": ..., "length": 12'
+        head = json.dumps({k: v for k, v in p.items() if k != "segments"})[:-1]
+        head = key + (head + ", " if len(head) > 1 else head)
+        points = _texts(p["segments"])
+        # ends[i]: bytes of points[:i] with a ", " after each
+        ends = list(itertools.accumulate((len(t) + 2 for t in points), initial=0))
+        whole = head + '"segments": '
+        size = len(whole) + max(ends[-1], 2) + 1  # "[...]}" without the last ", "
+        sep = 2 if players else 0
+        if used + sep + size <= budget:
+            players.append(whole + "[" + ", ".join(points) + "]}")
+            used += sep + size
+            continue
+
+        # cut the body into ranges, each carrying the head fields
+        offset = 0
+        while True:
+            sep = 2 if players else 0
+            prefix = f'{head}"seg_offset": {offset}, "seg_total": {len(points)}, "segments": '
+            room = budget - used - sep - len(prefix) - 1
+            n = bisect.bisect_right(ends, ends[offset] + room) - 1 - offset
+            if n <= 0 and (players or food):
+                flush()
+                continue
+            n = min(max(1, n), len(points) - offset)
+            players.append(prefix + "[" + ", ".join(points[offset:offset + n]) + "]}")
+            used += sep + len(players[-1])
+            offset += n
+            if offset >= len(points):
+                break
+            flush()
+
+    for t in _texts(food_in):
+        sep = 2 if food else 0
+        if used + sep + len(t) > budget and (players or food):
+            flush()
+            sep = 0
+        food.append(t)
+        used += sep + len(t)
+    flush()
+
+    if not parts:
+        parts.append(([], []))
+    out = [(envelope % (i, len(parts), ", ".join(players), ", ".join(food))).encode('utf-8')
+           for i, (players, food) in enumerate(parts)]
+    if any(len(data) > mtu - UDP_OVERHEAD for data in out):
+        # a snake head too big for the mtu on its own (a long uuid): send the
+        # whole state as one FRAG-cut PART, since FRAG frames of several parts
+        # would all be numbered `seq` and the Reassembler keeps only the first
+        msg = {"type": "PART", "seq": seq, "part": 0, "parts": 1,
+               "players": players_in, "food": food_in}
+        return fragment(json.dumps(msg).encode('utf-8'), seq, mtu)
+    return out
+
+
+class Reassembler:
+    """Rebuilds FRAG datagrams into payloads. Mirrored in client/netcode.py."""
+
+    def __init__(self):
+        self.pending = {}  # frame -> {index: bytes}
+        self.counts = {}
+        self.last_done = -1
+        self.dropped = 0
+
+    def feed(self, data):
+        """Returns: the complete payload once its last chunk arrives, else None."""
+        _, frame, index, count = FRAG_HEADER.unpack_from(data)
+        if frame <= self.last_done:
+            return None
+        chunks = self.pending.get(frame)
+        if chunks is None:
+            if len(self.pending) >= MAX_PENDING:
+                oldest = min(self.pending)
+                del self.pending[oldest], self.counts[oldest]
+                self.dropped += 1
+            chunks = self.pending[frame] = {}
+            self.counts[frame] = count
+        chunks[index] = bytes(data[FRAG_HEADER.size:])
+        if len(chunks) < count:
+            return None
+
+        payload = b''.join(chunks[i] for i in range(count))
+        self.last_done = frame
+        for old in [f for f in self.pending if f <= frame]:
+            if old != frame:
+                self.dropped += 1
+            del self.pending[old], self.counts[old]
+        return payload
+
+
+class PartAssembler:
+    """
+    Merges PART messages back into a state. A frame is returned as soon as
+    all its parts arrived, or, missing some, when the next frame starts.
+    """
+
+    def __init__(self):
+        self.seq = -1
+        self.parts = {}
+        self.expected = 0
+        self.done = False
+
+    def feed(self, msg):
+        seq = msg["seq"]
+        if seq < self.seq or (seq == self.seq and self.done):
+            return None
+        out = None
+        if seq != self.seq:
+            if self.parts:
+                out = self._merge()
+            self.seq, self.parts, self.expected, self.done = seq, {}, msg["parts"], False
+        self.parts[msg["part"]] = msg
+        if len(self.parts) == self.expected:
+            out = self._merge()
+            self.parts, self.done = {}, True
+        return out
+
+    def _merge(self):
+        players, ranges, food = {}, {}, []
+        for i in sorted(self.parts):
+            part = self.parts[i]
+            food.extend(part["food"])
+            for uid, p in part["players"].items():
+                if "seg_offset" not in p:
+                    players[uid] = p
+                    continue
+                if uid not in players:
+                    players[uid] = {k: v for k, v in p.items() if k not in ("seg_offset", "seg_total")}
+                ranges.setdefault(uid, []).append((p["seg_offset"], p["segments"]))
+        for uid, chunks in ranges.items():
+            chunks.sort(key=lambda c: c[0])
+            players[uid]["segments"] = [pt for _, segs in chunks for pt in segs]
+        return {"players": players, "food": food}
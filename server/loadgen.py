@@ -0,0 +1,331 @@
+"""
+UDP load generator: thousands of bot players in one asyncio process.
+
+Every bot is its own DatagramProtocol endpoint (own port, like a real
+client), JOINs with the snapshot protocol under test and steers with real
+angle/boost INPUTs, as JSON or the 32-byte binary struct. One send loop
+drives all bots at --input-rate, so there is no task or thread per bot.
+
+Per bot it records snapshot inter-arrival gaps (jitter), RTT and bytes
+received. RTT is the time from sending an INPUT to the first snapshot whose
+input echo ([seq, ticks], see delta.py) reports it applied, so it needs SNAP
+snapshots (--snapshots delta or binary) and JSON inputs, which carry a seq.
+Bots ack every SNAP they receive without decoding it; the server can't tell.
+
+    python loadgen.py --bots 2000 --duration 60 --snapshots binary --out load.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import struct
+import time
+from array import array
+
+from fragment import FRAG_MAGIC, Reassembler, clamp_mtu
+from packets import SNAP_MAGIC, SNAP_VERSIONS, snap_info
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SERVER_ADDR = ("127.0.0.1", 9999)
+INPUT_STRUCT_FMT = '<8s16sfi'  # server.parse_packet's binary input
+INPUT_RATE = 30          # inputs per second per bot
+TURN_INTERVAL = 1.5      # seconds between new wander directions
+TURN_SMOOTHING = 0.15
+BOOST_CHANCE = 0.002     # per input, start a short boost
+BOOST_TIME = 0.5
+REJOIN_DELAY = 1.0       # seconds a dead bot waits before joining again
+SENT_HISTORY = 256       # input send times kept for RTT matching
+REPORT_INTERVAL = 5.0
+
+
+class Bot(asyncio.DatagramProtocol):
+    def __init__(self, uid, args):
+        self.uid = uid
+        self.args = args
+        self.transport = None
+        self.reassembler = Reassembler()
+
+        # steering
+        self.angle = random.uniform(0, math.tau)
+        self.target = self.angle
+        self.next_turn = 0.0
+        self.boost_until = 0.0
+        self.seq = 0
+        self.sent = {}  # input seq -> send time
+        self.last_echo = -1
+
+        # measurements
+        self.joined_at = None
+        self.rejoin_at = None
+        self.last_arrival = None
+        self.gaps = array('f')   # seconds between snapshots
+        self.rtts = array('f')   # seconds
+        self.snapshots = 0
+        self.datagrams = 0
+        self.bytes = 0
+        self.deaths = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.join()
+
+    def join(self):
+        pkt = {"type": "JOIN", "uuid": self.uid}
+        if self.args.snapshots in ("delta", "binary"):
+            pkt["delta"] = True
+        if self.args.snapshots == "binary":
+            pkt["formats"] = list(SNAP_VERSIONS)
+        if self.args.mtu:
+            pkt["mtu"] = self.args.mtu
+        if self.args.interpolate:
+            pkt["interpolate"] = True
+        self.send_json(pkt)
+        self.joined_at = time.monotonic()
+        self.rejoin_at = None
+        self.last_arrival = None
+
+    def send_json(self, pkt):
+        self.transport.sendto(json.dumps(pkt).encode('utf-8'))
+
+    def send_input(self, now):
+        if self.rejoin_at is not None:
+            if now >= self.rejoin_at:
+                self.join()
+            return
+        if now >= self.next_turn:
+            self.target = random.uniform(0, math.tau)
+            self.next_turn = now + TURN_INTERVAL * random.uniform(0.5, 1.5)
+        diff = (self.target - self.angle + math.pi) % math.tau - math.pi
+        self.angle = (self.angle + diff * TURN_SMOOTHING) % math.tau
+        if random.random() < BOOST_CHANCE:
+            self.boost_until = now + BOOST_TIME
+        boost = now < self.boost_until
+
+        if self.args.input == "struct":
+            self.transport.sendto(struct.pack(INPUT_STRUCT_FMT, b"INPUT", self.uid.encode('utf-8'),
+                                              self.angle, int(boost)))
+            return
+        self.seq += 1
+        self.sent[self.seq] = now
+        if len(self.sent) > SENT_HISTORY:
+            del self.sent[self.seq - SENT_HISTORY]
+        self.send_json({"type": "INPUT", "uuid": self.uid, "seq": self.seq,
+                        "inp": {"angle": self.angle, "boost": boost}})
+
+    def datagram_received(self, data, addr):
+        now = time.monotonic()
+        self.datagrams += 1
+        self.bytes += len(data)
+        if data[:4] == FRAG_MAGIC:
+            try:
+                data = self.reassembler.feed(data)
+            except struct.error:
+                return
+            if data is None:
+                return
+        if data[:4] == SNAP_MAGIC:
+            try:
+                seq, echo = snap_info(data)
+            except (ValueError, struct.error):
+                return
+        else:
+            try:
+                pkt = json.loads(data.decode('utf-8'))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                return
+            kind = pkt.get("type")
+            if kind == "DEAD":
+                self.deaths += 1
+                self.rejoin_at = now + REJOIN_DELAY
+                return
+            if kind not in (None, "SNAP", "PART"):
+                return  # WELCOME, LEADERBOARD, ...
+            if kind == "PART" and pkt["part"]:
+                return  # one frame, time it by its first part
+            seq, echo = pkt.get("seq"), pkt.get("input")
+
+        self.snapshots += 1
+        if self.last_arrival is not None:
+            self.gaps.append(now - self.last_arrival)
+        self.last_arrival = now
+        if echo and echo[0] > self.last_echo:
+            self.last_echo = echo[0]
+            sent = self.sent.get(echo[0])
+            if sent is not None:
+                self.rtts.append(now - sent)
+        if self.args.snapshots != "json" and isinstance(seq, int):
+            self.send_json({"type": "ACK", "uuid": self.uid, "seq": seq})
+
+    def error_received(self, exc):
+        pass  # ICMP port unreachable while the server restarts
+
+
+def percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    n = len(ordered)
+    return {
+        "p50": ordered[n // 2] * 1000,
+        "p99": ordered[min(n - 1, int(n * 0.99))] * 1000,
+        "max": ordered[-1] * 1000,
+        "mean": sum(ordered) / n * 1000,
+    }
+
+
+def jitter(gaps):
+    """Standard deviation of the inter-arrival gaps."""
+    if len(gaps) < 2:
+        return None
+    mean = sum(gaps) / len(gaps)
+    return math.sqrt(sum((g - mean) ** 2 for g in gaps) / len(gaps))
+
+
+def summarize(bots, elapsed):
+    gaps = [g for b in bots for g in b.gaps]
+    rtts = [r for b in bots for r in b.rtts]
+    per_bot = sorted(b.bytes / elapsed for b in bots)
+    jitters = [j for j in (jitter(b.gaps) for b in bots) if j is not None]
+    return {
+        "bots": len(bots),
+        "seconds": elapsed,
+        "snapshots_per_s": sum(b.snapshots for b in bots) / elapsed,
+        "datagrams_per_s": sum(b.datagrams for b in bots) / elapsed,
+        "kbytes_per_s": sum(b.bytes for b in bots) / elapsed / 1000,
+        "bytes_per_bot_s": {"min": per_bot[0], "p50": per_bot[len(per_bot) // 2], "max": per_bot[-1]},
+        "silent_bots": sum(1 for b in bots if not b.snapshots),
+        "deaths": sum(b.deaths for b in bots),
+        "gap_ms": percentiles(gaps),
+        "jitter_ms": percentiles(jitters),  # spread of each bot's own jitter
+        "rtt_ms": percentiles(rtts),
+    }
+
+
+def reset(bots):
+    for b in bots:
+        b.gaps = array('f')
+        b.rtts = array('f')
+        b.snapshots = b.datagrams = b.bytes = b.deaths = 0
+
+
+def raise_fd_limit(needed):
+    """Every bot holds a socket; lift the soft open-file limit if we can."""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    want = needed + 64
+    if soft < want:
+        target = want if hard == resource.RLIM_INFINITY else min(want, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        if target < want:
+            print(f'[LOADGEN] open file limit {hard} caps this run at about {target - 64} bots')
+
+
+async def run(args):
+    loop = asyncio.get_running_loop()
+    raise_fd_limit(args.bots)
+    prefix = args.prefix or "lg%04d" % (os.getpid() % 10000)
+    bots = []
+    ramp_step = args.ramp / args.bots if args.bots else 0
+    for i in range(args.bots):
+        # the binary input struct has 16 bytes for the uuid
+        uid = f"{prefix}-{i}"[:16]
+        _, bot = await loop.create_datagram_endpoint(lambda: Bot(uid, args),
+                                                     remote_addr=(args.host, args.port))
+        bots.append(bot)
+        if ramp_step:
+            await asyncio.sleep(ramp_step)
+    print(f'[LOADGEN] {len(bots)} bots joined {args.host}:{args.port} '
+          f'({args.snapshots} snapshots, {args.input} inputs)')
+
+    await asyncio.sleep(args.warmup)
+    reset(bots)
+    period = 1.0 / args.input_rate
+    start = last_report = time.monotonic()
+    deadline = start
+    # how late each send pass started: if this grows, the generator itself is
+    # the bottleneck and the other numbers say nothing about the server
+    lags = array('f')
+    while True:
+        now = time.monotonic()
+        if now - start >= args.duration:
+            break
+        lags.append(max(0.0, now - deadline))
+        for bot in bots:
+            bot.send_input(now)
+        if now - last_report >= REPORT_INTERVAL:
+            s = summarize(bots, now - start)
+            gap, rtt = s["gap_ms"] or {}, s["rtt_ms"] or {}
+            print(f'[LOADGEN] {now - start:5.1f}s {s["snapshots_per_s"]:.0f} snaps/s '
+                  f'{s["kbytes_per_s"]:.0f} kB/s gap p50 {gap.get("p50", 0):.1f} p99 {gap.get("p99", 0):.1f} ms '
+                  f'rtt p50 {rtt.get("p50", 0):.1f} p99 {rtt.get("p99", 0):.1f} ms '
+                  f'silent {s["silent_bots"]} deaths {s["deaths"]} '
+                  f'generator lag p99 {(percentiles(lags) or {}).get("p99", 0):.1f} ms')
+            last_report = now
+        # fixed deadlines, like scheduler.TickScheduler, so a slow pass doesn't lower the rate
+        deadline = max(deadline + period, time.monotonic())
+        await asyncio.sleep(deadline - time.monotonic())
+
+    result = summarize(bots, time.monotonic() - start)
+    result["generator_lag_ms"] = percentiles(lags)
+    for bot in bots:
+        bot.transport.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=SERVER_ADDR[0])
+    parser.add_argument("--port", type=int, default=SERVER_ADDR[1])
+    parser.add_argument("--bots", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0,
+                        help="seconds after the last JOIN before measuring")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds to spread the JOINs over")
+    parser.add_argument("--input-rate", type=float, default=INPUT_RATE, help="inputs per second per bot")
+    parser.add_argument("--input", choices=("json", "struct"), default="json",
+                        help="JSON inputs (with seq) or the 32-byte binary struct")
+    parser.add_argument("--snapshots", choices=("json", "delta", "binary"), default="binary",
+                        help="plain JSON states, JSON delta SNAPs or binary SNAPs")
+    parser.add_argument("--mtu", type=int, help="ask for FRAG/PART datagrams of at most this size")
+    parser.add_argument("--interpolate", action="store_true",
+                        help="join like the PC client, for snapshots at the server's --send-rate")
+    parser.add_argument("--prefix", help="uuid prefix, to run several generators against one server")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON summary here instead of stdout")
+    args = parser.parse_args()
+    args.mtu = clamp_mtu(args.mtu)
+
+    random.seed(args.seed)
+    report = {
+        "meta": {
+            "host": args.host,
+            "port": args.port,
+            "input_rate": args.input_rate,
+            "input": args.input,
+            "snapshots": args.snapshots,
+            "mtu": args.mtu,
+            "interpolate": args.interpolate,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "result": asyncio.run(run(args)),
+    }
+    out = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(out)
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Low-rate decimated feed for whole-map spectators.
+
+A spectator that sends {"type": "SPECTATE", "feed": "overview"} gets
+OVERVIEW messages at SPECTATE_RATE instead of full snapshots every
+broadcast. The whole map is drawn small there, so:
+
+  - bodies keep every `stride`-th point, picked from the spectator's zoom
+    (screen pixels per world unit) so points land about OVERVIEW_PIXELS
+    apart on screen; coordinates are rounded to whole units
+  - food is counted per OVERVIEW_CELL square ("food": "cells", the default)
+    or left out ("food": "none")
+
+Spectators asking for the same stride and food mode share one encode.
+A HEARTBEAT carrying "zoom" changes the stride, e.g. after a resize.
+
+Wire format (JSON, PART-split like other states when the spectator sent "mtu"):
+  {"type": "OVERVIEW", "players": {uuid: {"x", "y", "length", "segments"}},
+   "food": [[x, y, count], ...]}
+"""
+
+import math
+
+from core import SEGMENT_SPACING
+
+SPECTATE_RATE = 8         # overview messages per second
+OVERVIEW_PIXELS = 4       # target screen distance between body points
+DEFAULT_ZOOM = 0.3        # roughly a 3000-unit map in a 1000-pixel window
+MAX_STRIDE = 16
+OVERVIEW_CELL = 150       # food aggregation square, a multiple of FOOD_CELL
+FOOD_MODES = ("cells", "none")
+
+
+def stride_for(zoom):
+    """Body point stride that keeps points about OVERVIEW_PIXELS apart at `zoom`."""
+    if not isinstance(zoom, (int, float)) or not 0 < zoom < math.inf:
+        zoom = DEFAULT_ZOOM
+    return max(1, min(MAX_STRIDE, round(OVERVIEW_PIXELS / (SEGMENT_SPACING * zoom))))
+
+
+def settings(pkt):
+    """(stride, food mode) requested by a SPECTATE packet, or None for the full feed."""
+    if pkt.get("feed") != "overview":
+        return None
+    food = pkt.get("food")
+    return stride_for(pkt.get("zoom")), food if food in FOOD_MODES else FOOD_MODES[0]
+
+
+def build(world, stride, food):
+    """The overview state of `world` (a Game or GameFrame)."""
+    players = {}
+    for uid, s in world.players.items():
+        segs = s.segments()[::stride]
+        players[uid] = {"x": round(s.x), "y": round(s.y), "length": round(s.length_units),
+                        "segments": segs.round().astype(int).tolist()}
+    return {"type": "OVERVIEW", "players": players,
+            "food": food_cells(world.food) if food == "cells" else []}
+
+
+def food_cells(grid):
+    """Pellets counted per OVERVIEW_CELL square: [[centre x, centre y, count], ...]."""
+    per = OVERVIEW_CELL // grid.cell
+    counts = {}
+    for (col, row), bucket in grid.buckets.items():
+        key = (col // per, row // per)
+        counts[key] = counts.get(key, 0) + len(bucket)
+    half = OVERVIEW_CELL / 2
+    return [[cx * OVERVIEW_CELL + half, cy * OVERVIEW_CELL + half, n]
+            for (cx, cy), n in counts.items()]
@@ -1,74 +1,269 @@
 import struct
 import math
+from functools import lru_cache
+from itertools import chain
+
+import numpy as np
+
+# Layout (little endian, every block padded to 4 bytes):
+#   "GAMEDATA"
+#   u16 player_count, 2 pad
+#   per player:
+#     u8 uuid_len, uuid bytes, pad to 4
+#     f32 x, f32 y, u16 angle, u8 boost, 1 pad, f32 length
+#     u16 segment_count, 2 pad
+#     segment_count * (f32 x, f32 y)
+#   u16 food_count, 2 pad
+#   food_count * (f32 x, f32 y, u8 size, 3 pad)
+HEADER = b'GAMEDATA'
+_COUNT = struct.Struct("<Hxx")
+_UUID_LEN = struct.Struct("<B")
+_PLAYER = struct.Struct("<ffHBxfHxx")
+_FOOD_SIZE = 12
+
+
+@lru_cache(maxsize=512)
+def _segments_struct(n):
+    return struct.Struct("<%df" % (2 * n))
+
+
+@lru_cache(maxsize=512)
+def _food_struct(n):
+    return struct.Struct("<" + "ffBxxx" * n)
+
+
+def _pad4(n):
+    return (4 - n % 4) % 4
+
 
 def compress_packet(state_dict):
     """
     Compresses Game State with Little Endian (<) and 4-byte alignment padding.
+
+    The exact size is computed first and everything is written into one
+    preallocated buffer with precompiled structs; each snake's segments and
+    the whole food list are packed with a single call each.
     """
-    data = bytearray()
-    
     players = state_dict.get("players", {})
-    # Write Player Count (2 bytes)
-    data.extend(struct.pack("<H", len(players)))
-    # PADDING: Align to 4 bytes (we are at offset 2, need 2 more)
-    data.extend(b'\x00\x00')
-    
+    food_list = state_dict.get("food", [])
+
+    # 1. Size pass
+    uuids = []
+    size = len(HEADER) + _COUNT.size
     for uuid_str, p_data in players.items():
         uuid_bytes = uuid_str.encode('utf-8')
+        uuids.append(uuid_bytes)
+        size += 1 + len(uuid_bytes) + _pad4(1 + len(uuid_bytes))
+        size += _PLAYER.size + 8 * len(p_data["segments"])
+    size += _COUNT.size + _FOOD_SIZE * len(food_list)
+
+    # 2. Write pass
+    buf = bytearray(size)
+    buf[:len(HEADER)] = HEADER
+    off = len(HEADER)
+    _COUNT.pack_into(buf, off, len(players))
+    off += _COUNT.size
+
+    for uuid_bytes, p_data in zip(uuids, players.values()):
         u_len = len(uuid_bytes)
-        
-        # 1. Write UUID Len (1 byte) and UUID Bytes
-        data.extend(struct.pack("<B", u_len))
-        data.extend(uuid_bytes)
-        
-        # PADDING: Calculate bytes needed to reach next 4-byte boundary
-        # Current chunk size = 1 (len) + u_len
-        pad_needed = (4 - (1 + u_len) % 4) % 4
-        data.extend(b'\x00' * pad_needed)
-        
-        # 2. Write Basic Info
+        _UUID_LEN.pack_into(buf, off, u_len)
+        buf[off + 1:off + 1 + u_len] = uuid_bytes
+        off += 1 + u_len + _pad4(1 + u_len)
+
         # Angle mapped 0-65535
         angle_mapped = int((p_data["angle"] % (2 * math.pi)) / (2 * math.pi) * 65535)
         boost_byte = 1 if p_data["boost"] else 0
-        
-        # X(4), Y(4) -> Aligned
-        # Angle(2), Boost(1) -> Total 3 bytes. Need 1 byte pad after.
-        data.extend(struct.pack("<ffHB", 
-            p_data["x"], 
-            p_data["y"], 
-            angle_mapped, 
-            boost_byte
-        ))
-        
-        # PADDING: Align after Boost (we are 3 bytes into a 4-byte word)
-        data.extend(b'\x00') 
-
-        # 3. Write Length (float is 4 bytes) -> Aligned
-        data.extend(struct.pack("<f", p_data["length"]))
-        
-        # 4. Segments
         segs = p_data["segments"]
-        data.extend(struct.pack("<H", len(segs)))
-        
-        # PADDING: Align after Segment Count (2 bytes) -> Need 2 bytes
-        data.extend(b'\x00\x00')
+        _PLAYER.pack_into(buf, off, p_data["x"], p_data["y"], angle_mapped, boost_byte,
+                          p_data["length"], len(segs))
+        off += _PLAYER.size
 
-        for seg in segs:
-            data.extend(struct.pack("<ff", seg[0], seg[1]))
+        if segs:
+            _segments_struct(len(segs)).pack_into(buf, off, *chain.from_iterable(segs))
+            off += 8 * len(segs)
 
-    # 3. Food
-    food_list = state_dict.get("food", [])
-    data.extend(struct.pack("<H", len(food_list)))
-    
-    # PADDING: Align after Food Count (2 bytes) -> Need 2 bytes
-    data.extend(b'\x00\x00')
-    
-    for f in food_list:
-        # X(4), Y(4), Size(1) -> Total 9 bytes.
-        # Next struct needs to start on 4-byte boundary. 
-        # 9 % 4 = 1. We need 3 bytes of padding.
-        data.extend(struct.pack("<ffB", f["x"], f["y"], f["size"]))
-        data.extend(b'\x00\x00\x00')
-    
-    # Add Header
-    return b'GAMEDATA' + bytes(data)
+    _COUNT.pack_into(buf, off, len(food_list))
+    off += _COUNT.size
+    if food_list:
+        _food_struct(len(food_list)).pack_into(
+            buf, off, *chain.from_iterable((f["x"], f["y"], f["size"]) for f in food_list))
+
+    return bytes(buf)
+
+
+# ==========================================
+# SNAP: binary form of the delta.py snapshot messages (PC clients)
+# ==========================================
+#
+# Negotiated in JOIN with "formats": [versions...]; the server answers with
+# {"type": "WELCOME", "format": version}. Little endian, no padding:
+#   header: "SNAP", u8 version, u8 flags (1 = delta, 2 = input echo),
+#           u16 player_count, u32 seq, u32 base (0 for full snapshots)
+#   v2, if flags & 2: u32 input seq, u16 ticks   (the "input" field, see
+#           rooms.Room.send_list; lets the client reconcile its prediction)
+#   per player:
+#     u8 uuid_len, uuid bytes, u8 kind (0 = full, 1 = change)
+#     u16 x, u16 y, u16 angle, u8 boost, f32 length, u32 first_id
+#     full:   u32 sid, u16 n, n * point (u16 x, u16 y)
+#     change: u16 n, n * point (push), u16 keep, u16 n, n * point (tail)
+#   u16 n, n * (u32 id, u16 x, u16 y, u8 size)      food (added)
+#   u16 n, n * u32 id                                food removed (delta only)
+# Positions are quantized to 1/65535 of the world (~0.05 units).
+SNAP_MAGIC = b'SNAP'
+SNAP_VERSION = 2
+SNAP_VERSIONS = (1, 2)
+WORLD_W, WORLD_H = 3000, 3000
+
+_SNAP_HEADER = struct.Struct("<4sBBHII")
+_SNAP_PLAYER = struct.Struct("<HHHBfI")
+_SNAP_SID = struct.Struct("<I")
+_SNAP_INPUT = struct.Struct("<IH")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_X_SCALE = 65535 / WORLD_W
+_Y_SCALE = 65535 / WORLD_H
+_ANGLE_SCALE = 65535 / (2 * math.pi)
+_X_UNIT = 1 / _X_SCALE
+_Y_UNIT = 1 / _Y_SCALE
+
+
+@lru_cache(maxsize=512)
+def _points_struct(n):
+    return struct.Struct("<%dH" % (2 * n))
+
+
+@lru_cache(maxsize=512)
+def _snap_food_struct(n):
+    return struct.Struct("<" + "IHHB" * n)
+
+
+@lru_cache(maxsize=512)
+def _ids_struct(n):
+    return struct.Struct("<%dI" % n)
+
+
+def _q(v, scale):
+    return min(65535, max(0, int(v * scale + 0.5)))
+
+
+def _pack_points(parts, points):
+    n = len(points)
+    parts.append(_U16.pack(n))
+    if n > 32:
+        q = np.rint(np.asarray(points, dtype=np.float64) * (_X_SCALE, _Y_SCALE))
+        parts.append(np.clip(q, 0, 65535).astype('<u2').tobytes())
+    elif n:
+        # a delta usually pushes one or two points, not worth a numpy round trip
+        parts.append(_points_struct(n).pack(*chain.from_iterable(
+            (_q(x, _X_SCALE), _q(y, _Y_SCALE)) for x, y in points)))
+
+
+def encode_snap(msg, version=SNAP_VERSION):
+    """Pack a delta.full_message()/delta_message() dict into SNAP bytes."""
+    is_delta = "base" in msg
+    players = msg["players"]
+    echo = msg.get("input") if version >= 2 else None
+    flags = (1 if is_delta else 0) | (2 if echo else 0)
+    parts = [_SNAP_HEADER.pack(SNAP_MAGIC, version, flags,
+                               len(players), msg["seq"], msg.get("base", 0))]
+    if echo:
+        parts.append(_SNAP_INPUT.pack(echo[0], min(echo[1], 65535)))
+    for uid, e in players.items():
+        uuid_bytes = uid.encode('utf-8')
+        full = "segments" in e
+        parts.append(_U8.pack(len(uuid_bytes)) + uuid_bytes + _U8.pack(0 if full else 1))
+        parts.append(_SNAP_PLAYER.pack(
+            _q(e["x"], _X_SCALE), _q(e["y"], _Y_SCALE),
+            int((e["angle"] % (2 * math.pi)) * _ANGLE_SCALE),
+            1 if e["boost"] else 0, e["length"], e["h"]))
+        if full:
+            parts.append(_SNAP_SID.pack(e["sid"]))
+            _pack_points(parts, e["segments"])
+        else:
+            _pack_points(parts, e["push"])
+            parts.append(_U16.pack(e["keep"]))
+            _pack_points(parts, e.get("tail", ()))
+
+    food = msg["food_add"] if is_delta else msg["food"]
+    parts.append(_U16.pack(len(food)))
+    if food:
+        parts.append(_snap_food_struct(len(food)).pack(*chain.from_iterable(
+            (fid, _q(x, _X_SCALE), _q(y, _Y_SCALE), size) for fid, x, y, size in food)))
+    if is_delta:
+        removed = msg["food_del"]
+        parts.append(_U16.pack(len(removed)))
+        if removed:
+            parts.append(_ids_struct(len(removed)).pack(*removed))
+    return b''.join(parts)
+
+
+def snap_info(data):
+    """(seq, input echo or None) of SNAP bytes, without decoding the body."""
+    magic, version, flags, _, seq, _ = _SNAP_HEADER.unpack_from(data, 0)
+    if magic != SNAP_MAGIC or version not in SNAP_VERSIONS:
+        raise ValueError("unsupported snapshot format %r v%d" % (magic, version))
+    if flags & 2:
+        return seq, list(_SNAP_INPUT.unpack_from(data, _SNAP_HEADER.size))
+    return seq, None
+
+
+def _unpack_points(data, off, n):
+    """Returns: ([(x, y), ...], new offset)."""
+    if not n:
+        return [], off
+    vals = _points_struct(n).unpack_from(data, off)
+    xs = map(_X_UNIT.__mul__, vals[0::2])
+    ys = map(_Y_UNIT.__mul__, vals[1::2])
+    return list(zip(xs, ys)), off + 4 * n
+
+
+def decode_snap(data):
+    """Inverse of encode_snap(). Returns the message dict delta.DeltaDecoder expects."""
+    magic, version, flags, n_players, seq, base = _SNAP_HEADER.unpack_from(data, 0)
+    if magic != SNAP_MAGIC or version not in SNAP_VERSIONS:
+        raise ValueError("unsupported snapshot format %r v%d" % (magic, version))
+    off = _SNAP_HEADER.size
+    echo = None
+    if flags & 2:
+        echo = list(_SNAP_INPUT.unpack_from(data, off))
+        off += _SNAP_INPUT.size
+    players = {}
+    for _ in range(n_players):
+        u_len = data[off]
+        uid = bytes(data[off + 1:off + 1 + u_len]).decode('utf-8')
+        kind = data[off + 1 + u_len]
+        off += 2 + u_len
+        x, y, angle, boost, length, first_id = _SNAP_PLAYER.unpack_from(data, off)
+        off += _SNAP_PLAYER.size
+        e = {"x": x * _X_UNIT, "y": y * _Y_UNIT, "angle": angle / _ANGLE_SCALE,
+             "boost": bool(boost), "length": length, "h": first_id}
+        if kind == 0:
+            (e["sid"],) = _SNAP_SID.unpack_from(data, off)
+            (n,) = _U16.unpack_from(data, off + 4)
+            e["segments"], off = _unpack_points(data, off + 6, n)
+        else:
+            (n,) = _U16.unpack_from(data, off)
+            e["push"], off = _unpack_points(data, off + 2, n)
+            (e["keep"],) = _U16.unpack_from(data, off)
+            (n,) = _U16.unpack_from(data, off + 2)
+            tail, off = _unpack_points(data, off + 4, n)
+            if tail:
+                e["tail"] = tail
+        players[uid] = e
+
+    (n,) = _U16.unpack_from(data, off)
+    vals = _snap_food_struct(n).unpack_from(data, off + 2)
+    off += 2 + 9 * n
+    food = list(zip(vals[0::4], map(_X_UNIT.__mul__, vals[1::4]),
+                    map(_Y_UNIT.__mul__, vals[2::4]), vals[3::4]))
+    msg = {"type": "SNAP", "seq": seq, "players": players}
+    if echo:
+        msg["input"] = echo
+    if flags & 1:
+        (n,) = _U16.unpack_from(data, off)
+        msg["base"] = base
+        msg["food_add"] = food
+        msg["food_del"] = list(_ids_struct(n).unpack_from(data, off + 2))
+    else:
+        msg["food"] = food
+    return msg
@@ -0,0 +1,624 @@
+"""
+Game rooms: independent arenas behind the one UDP port.
+
+server.UDPServer owns the socket, parses every datagram and routes it to
+the room its uuid was placed in; new players go to the room with the
+fewest players. A Room has its own Game, tick loop and snapshot fan-out.
+
+With --workers, rooms run in worker processes so arenas use every core.
+A worker gets the server socket for sending only (the main process does
+all the reading) and a pipe. In come ("packet", room_id, (packet, addr))
+and ("drop", room_id, uid) when the router moved a uuid to another room,
+written by a WorkerPipe thread so a busy worker never blocks the router.
+Back go ("left", room_id, uid) notices so the router can forget clients
+that timed out or died, and ("stats", room_id, Room.stats()) every
+STATS_INTERVAL so the router can answer STATS without asking.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core import Game, FOOD_COUNT
+from bots import BotController
+from scheduler import TickScheduler
+import delta
+import codec
+import fragment
+import overview
+import stats
+
+# Attempt to import packets, fallback if not available
+try:
+    import packets
+except ImportError:
+    packets = None
+
+TIMEOUT_LIMIT = 50
+# Area of interest: what a PC client can see around its head, plus slack for
+# camera smoothing and snakes entering the screen.
+VIEW_W, VIEW_H = 1200, 800
+VIEW_MARGIN = 300
+VIEW_SNAP = 50  # view centres snap to this grid so nearby clients share encodes
+# Snapshots per second to clients that JOIN with "interpolate": true. The PC
+# client renders between snapshots, so 20 Hz looks as smooth as 60; everyone
+# else (TinyScreen, server/client.py) still gets one per simulated tick.
+SEND_RATE = 20
+# LEADERBOARD messages per second, to clients that JOIN with "leaderboard": true
+LEADERBOARD_RATE = 1.0
+LEADERBOARD_SIZE = 10
+STATS_INTERVAL = 1.0  # seconds between worker stats reports
+MAX_INPUT_SEQ = 2 ** 32  # echoed back as a u32 in binary SNAPs
+ERROR_LOG_INTERVAL = 5.0  # seconds between logs of failed per-client snapshots
+PIPE_BACKLOG = 4096  # packets queued for a busy worker before new ones are dropped
+
+
+def make_game(engine, food_count=FOOD_COUNT):
+    if engine == "numpy":
+        from vector import VectorGame
+        return VectorGame(food_count=food_count)
+    return Game(food_count=food_count)
+
+
+def make_room(room_id, args, transport, on_leave):
+    """A Room set up from the server's command line `args`, in the main process or a worker."""
+    return Room(room_id, make_game(args.engine), transport,
+                TickScheduler(args.tick_rate, args.max_catchup),
+                args.view_margin, not args.no_aoi, on_leave=on_leave,
+                pipeline=not args.no_pipeline, send_rate=args.send_rate,
+                spectate_rate=args.spectate_rate, bots=args.bots)
+
+
+class Room:
+    """
+    One arena. With `pipeline` the tick loop only simulates: each broadcast
+    is handed to a sender thread as a frozen copy of the world (Game.freeze)
+    plus the per-client send list, so encoding and sendto for tick N run
+    while tick N+1 simulates. If the sender is still busy when a broadcast
+    is due, it is put off to the next tick rather than delaying the
+    simulation. Interpolating clients ride along on at most `send_rate` of
+    the broadcasts and overview spectators (overview.py) on at most
+    `spectate_rate`; a tick nobody is due a snapshot sends nothing. With
+    `bots`, a BotController keeps that many server-side bots in the game.
+    """
+    def __init__(self, room_id, game, transport, scheduler=None, view_margin=VIEW_MARGIN,
+                 aoi=True, on_leave=None, pipeline=True, send_rate=SEND_RATE,
+                 spectate_rate=overview.SPECTATE_RATE, bots=0):
+        self.id = room_id
+        self.game = game
+        # anything with a thread-safe sendto(data, addr), e.g. SocketSender
+        self.transport = transport
+        self.scheduler = scheduler or TickScheduler()
+        # None sends every client the whole world
+        self.view_half = (VIEW_W / 2 + view_margin, VIEW_H / 2 + view_margin) if aoi else None
+        self.on_leave = on_leave or (lambda room_id, uid: None)
+        self.clients = {} # Key: UUID, Value: {addr, last_updated, is_spectator, codec, delta, format, mtu, input_seq, input_applied, overview, leaderboard, interpolate}
+        self.snapshots = codec.SnapshotCache(game)
+        self.frame = 0  # numbers FRAG/PART datagrams of one broadcast
+        self.ticks = 0  # Game.tick() calls so far
+        # fraction of an interpolating client's snapshot earned per simulated tick
+        self.send_step = min(1.0, send_rate * self.scheduler.period)
+        self.send_credit = 1.0
+        self.overview_step = min(1.0, spectate_rate * self.scheduler.period)
+        self.overview_credit = 1.0
+        self.leaderboard_every = max(1, round(1.0 / (LEADERBOARD_RATE * self.scheduler.period)))
+        # latest input per player; a newer INPUT overwrites the slot, so a
+        # tick applies at most one input per player however many arrived
+        self.inputs = {}
+        self.input_stats = {"received": 0, "applied": 0, "coalesced": 0, "dropped": 0}
+        self.sender = ThreadPoolExecutor(1, f"room{room_id}-send") if pipeline else None
+        self.inflight = None  # the broadcast the sender is working on
+        self.skipped = 0      # broadcasts put off because the sender was busy
+        self.client_errors = 0  # per-client snapshots whose encode or send failed
+        self._last_error_log = float("-inf")
+        self.bots = BotController(game, bots) if bots > 0 else None
+
+        # instrumentation, see stats.py and stats()
+        self.phases = {}  # phase name -> Histogram of ms, tick loop and Game.tick alike
+        self.timer = stats.PhaseTimer(self.phases)
+        game.timer = stats.PhaseTimer(self.phases)
+        self.client_bytes = stats.Histogram(stats.BYTES_BUCKETS)
+        self.packets_out = stats.Histogram(stats.BYTES_BUCKETS)
+
+    def handle(self, pkt, addr):
+        """One parsed packet routed here by the server."""
+        msg_type = pkt.get("type")
+        msg_uuid = pkt.get("uuid")
+
+        if msg_type == "JOIN":
+            print(f'[SERVER] Player JOIN from {addr} ({msg_uuid}) in room {self.id}')
+            # settle the client first: a JOIN it can't make sense of must not leave a snake behind
+            self.add_client(msg_uuid, addr, pkt, is_spectator=False)
+            self.game.add_player(msg_uuid)
+            return
+
+        if msg_type == "SPECTATE":
+            print(f'[SERVER] Spectator JOIN from {addr} ({msg_uuid}) in room {self.id}')
+            # Add to clients list so they get updates, but DON'T add to Game engine
+            self.add_client(msg_uuid, addr, pkt, is_spectator=True)
+            return
+
+        if msg_type == "ACK":
+            client = self.clients.get(msg_uuid)
+            if client and client["delta"] is not None and isinstance(pkt.get("seq"), int):
+                client["last_updated"] = time.time()
+                client["delta"].ack(pkt["seq"])
+            return
+
+        if msg_type == "HEARTBEAT":
+            # Keep alive for spectators or idle players
+            client = self.clients.get(msg_uuid)
+            if client is not None:
+                client["last_updated"] = time.time()
+                if client["overview"] is not None and "zoom" in pkt:
+                    client["overview"] = (overview.stride_for(pkt["zoom"]), client["overview"][1])
+            return
+
+        # Standard Input Packet
+        client = self.clients.get(msg_uuid)
+        if client is None:
+            return
+        client["addr"] = addr
+        if client["is_spectator"]:
+            return
+        client["last_updated"] = time.time()
+        if msg_type == "INPUT":
+            self.offer_input(msg_uuid, client, pkt)
+
+    def drop(self, uid):
+        """Forget `uid` without telling the router, which has already placed it elsewhere (or as a spectator)."""
+        self.clients.pop(uid, None)
+        self.inputs.pop(uid, None)
+        self.game.remove_player(uid)
+
+    def offer_input(self, uid, client, pkt):
+        """
+        Put an INPUT in the player's slot. Packets carrying a "seq" older
+        than the newest one accepted, or outside [0, MAX_INPUT_SEQ), are
+        dropped; ones without (the binary TinyScreen input) are always taken.
+        """
+        stats = self.input_stats
+        stats["received"] += 1
+        inp = pkt.get("inp")
+        seq = pkt.get("seq")
+        if not isinstance(inp, dict):
+            stats["dropped"] += 1
+            return
+        if isinstance(seq, int):
+            if not 0 <= seq < MAX_INPUT_SEQ:
+                stats["dropped"] += 1
+                return
+            if seq <= client["input_seq"]:
+                stats["dropped"] += 1  # reordered or duplicated
+                return
+            client["input_seq"] = seq
+        if uid in self.inputs:
+            stats["coalesced"] += 1
+        self.inputs[uid] = inp
+
+    def add_client(self, uid, addr, pkt, is_spectator):
+        """Register a client and settle its snapshot protocol from the JOIN/SPECTATE packet."""
+        fmt = None
+        offered = pkt.get("formats")
+        if packets and isinstance(offered, list):
+            common = {f for f in offered if type(f) is int} & set(packets.SNAP_VERSIONS)
+            fmt = max(common) if common else None
+        # binary snapshots are SNAP messages, so they need an encoder even without acks
+        use_snap = bool(pkt.get("delta")) or fmt is not None
+        self.clients[uid] = {
+            "addr": addr,
+            "last_updated": time.time(),
+            "is_spectator": is_spectator,
+            "codec": codec.choose_codec(uid, pkt),
+            "delta": delta.DeltaEncoder() if use_snap else None,
+            "format": fmt,
+            # None: client can't reassemble, send whole datagrams as before
+            "mtu": fragment.clamp_mtu(pkt.get("mtu")),
+            "input_seq": -1,  # newest INPUT seq accepted
+            "input_applied": None,  # (seq, self.ticks) when it reached the game
+            # (stride, food mode) for overview spectators, None for the full feed
+            "overview": overview.settings(pkt) if is_spectator else None,
+            "leaderboard": bool(pkt.get("leaderboard")),
+            # renders between snapshots, so send_rate of them are enough
+            "interpolate": pkt.get("interpolate") is True,
+        }
+        self.inputs.pop(uid, None)
+        if fmt is not None:
+            welcome = json.dumps({"type": "WELCOME", "format": fmt}).encode('utf-8')
+            self.send(welcome, addr)
+
+    async def tick_loop(self):
+        timer = self.timer
+        while True:
+            due = await self.scheduler.wait()
+            loop_start = time.perf_counter()
+            timer.start()
+
+            for uid, inp in self.inputs.items():
+                self.game.input(uid, inp)
+                client = self.clients.get(uid)
+                if client is not None and client["input_seq"] >= 0:
+                    client["input_applied"] = (client["input_seq"], self.ticks)
+            self.input_stats["applied"] += len(self.inputs)
+            self.inputs.clear()
+            timer.mark("input")
+
+            inactive_users = []
+            for uid, client in self.clients.items():
+                if time.time() - client["last_updated"] > TIMEOUT_LIMIT:
+                    inactive_users.append(uid)
+
+            for uid in inactive_users:
+                is_spec = self.clients[uid]["is_spectator"]
+                del self.clients[uid]
+                if not is_spec:
+                    self.game.remove_player(uid)
+                self.on_leave(self.id, uid)
+                print(f'[SERVER] Removed {"spectator" if is_spec else "player"} {uid} due to timeout.')
+            timer.mark("timeouts")
+
+            # catch up on missed deadlines before a single broadcast;
+            # Game.tick times its own phases (simulate, food, ...) in between
+            dead_players = []
+            for _ in range(due):
+                if self.bots is not None:
+                    timer.start()
+                    self.bots.step()
+                    timer.mark("bots")
+                tick_start = time.perf_counter()
+                dead_players.extend(self.game.tick())
+                timer.observe("tick", (time.perf_counter() - tick_start) * 1000)
+            self.ticks += due
+            timer.start()
+
+            for dead_uid in dead_players:
+                if dead_uid in self.clients:
+                    client = self.clients[dead_uid]
+                    dead_msg = json.dumps({"type": "DEAD"}).encode('utf-8')
+                    self.send(dead_msg, client['addr'])
+                    del self.clients[dead_uid]
+                    self.on_leave(self.id, dead_uid)
+
+            if self.ticks // self.leaderboard_every != (self.ticks - due) // self.leaderboard_every:
+                self.send_leaderboard()
+
+            timer.mark("events")
+
+            self.send_credit = min(1.0, self.send_credit + due * self.send_step)
+            self.overview_credit = min(1.0, self.overview_credit + due * self.overview_step)
+            # a broadcast put off by a busy sender keeps its credits and is retried next tick
+            self.start_broadcast()
+            timer.observe("loop", (time.perf_counter() - loop_start) * 1000)
+
+    def start_broadcast(self):
+        """
+        Broadcast inline, or hand a frozen copy to the sender thread unless it is still busy.
+        Returns: False if the sender was busy and nothing was sent.
+        """
+        if self.sender is None:
+            send_list = self.send_list()
+            if send_list is None:
+                return True
+            world = self.game
+            self.timer.mark("state")
+            try:
+                self.broadcast(world, *send_list)
+            except Exception as error:
+                print(f'[SERVER] room {self.id} broadcast failed: {error!r}')
+            return True
+        if self.inflight is not None:
+            if not self.inflight.done():
+                self.skipped += 1
+                return False
+            error = self.inflight.exception()
+            if error is not None:
+                # one bad snapshot must not stop the simulation
+                print(f'[SERVER] room {self.id} broadcast failed: {error!r}')
+        send_list = self.send_list()
+        if send_list is None:
+            return True
+        world = self.game.freeze()
+        self.timer.mark("state")
+        self.inflight = self.sender.submit(self.broadcast, world, *send_list)
+        return True
+
+    def send(self, data, addr):
+        """transport.sendto, counted in the packets_out histogram. Returns: bytes sent."""
+        self.packets_out.observe(len(data))
+        self.transport.sendto(data, addr)
+        return len(data)
+
+    def send_leaderboard(self):
+        """
+        The top LEADERBOARD_SIZE scores, the player count and the receiver's
+        own [rank, score] (players only) as one small JSON datagram:
+          {"type": "LEADERBOARD", "top": [[uuid, score], ...], "players": n[, "you": [rank, score]]}
+        """
+        board = self.game.leaderboard
+        msg = {"type": "LEADERBOARD", "players": len(board), "top": board.top(LEADERBOARD_SIZE)}
+        shared = json.dumps(msg).encode('utf-8')
+        for uid, client in self.clients.items():
+            if not client["leaderboard"]:
+                continue
+            rank = board.rank(uid)
+            if rank is None:
+                data = shared
+            else:
+                data = json.dumps(dict(msg, you=[rank, board.scores[uid]])).encode('utf-8')
+            self.send(data, client["addr"])
+
+    def send_list(self):
+        """
+        Everything the broadcast needs from the client table, copied so the
+        sender thread never reads `self.clients` while the loop changes it.
+        Interpolating clients and overview spectators are only listed when
+        their credit is due. Returns: (frame number, [(addr, view, codec,
+        delta encoder, format, mtu, echo), ...], [(addr, mtu, stride, food
+        mode), ...]), or None when no client is due a snapshot this tick.
+        """
+        snaps_due = self.send_credit >= 1.0 - 1e-9
+        overview_due = self.overview_credit >= 1.0 - 1e-9
+        targets, watchers = [], []
+        interpolating = False
+        for uid, client in self.clients.items():
+            if client["overview"] is not None:
+                if overview_due:
+                    watchers.append((client["addr"], client["mtu"]) + client["overview"])
+            elif snaps_due or not client["interpolate"]:
+                interpolating = interpolating or client["interpolate"]
+                targets.append((client["addr"], self.client_view(uid, client), client["codec"],
+                                client["delta"], client["format"], client["mtu"],
+                                self.input_echo(client)))
+        if interpolating:
+            self.send_credit -= 1.0
+        if watchers:
+            self.overview_credit -= 1.0
+        if not targets and not watchers:
+            return None
+        self.frame += 1
+        return self.frame, targets, watchers
+
+    def input_echo(self, client):
+        """[newest applied input seq, ticks simulated with it] for prediction, or None."""
+        applied = client["input_applied"]
+        if applied is None:
+            return None
+        return [applied[0], self.ticks - applied[1]]
+
+    def broadcast(self, world, frame, targets, watchers=()):
+        """Encode and send one snapshot of `world` (a Game or a frozen GameFrame)."""
+        clock = time.perf_counter
+        encode_s = 0.0
+        start = clock()
+        # Stateless codecs are encoded once per (codec, view) and shared
+        self.snapshots.begin_tick(world)
+        # one client's failure must not starve the ones after it
+        for addr, view, codec_name, encoder, fmt, mtu, echo in targets:
+            t0 = clock()
+            try:
+                datagrams = self.encode_for(frame, view, codec_name, encoder, fmt, mtu, echo)
+                encode_s += clock() - t0
+                self.client_bytes.observe(sum(self.send(d, addr) for d in datagrams))
+            except Exception as error:
+                self.client_failed(addr, error)
+        # built once per (stride, food, mtu) and shared by every watcher
+        for addr, mtu, stride, food in watchers:
+            t0 = clock()
+            try:
+                datagrams = self.snapshots.overview(stride, food, mtu, frame)
+                encode_s += clock() - t0
+                self.client_bytes.observe(sum(self.send(d, addr) for d in datagrams))
+            except Exception as error:
+                self.client_failed(addr, error)
+        self.timer.observe("encode", encode_s * 1000)
+        self.timer.observe("send", (clock() - start - encode_s) * 1000)
+
+    def encode_for(self, frame, view, codec_name, encoder, fmt, mtu, echo):
+        """One send_list target's snapshot as the datagrams to send."""
+        if encoder is not None:
+            datagrams = [self.snapshots.snap(encoder, fmt, view, echo)]
+        elif mtu and codec_name == "json":
+            # self-contained partial snapshots: a lost datagram only loses its snakes
+            return self.snapshots.parts(view, mtu, frame)
+        else:
+            datagrams = [self.snapshots.get(codec_name, view)]
+        if mtu:
+            datagrams = fragment.fragment(datagrams[0], frame, mtu)
+        return datagrams
+
+    def client_failed(self, addr, error):
+        """Count a failed per-client snapshot; logged at most every ERROR_LOG_INTERVAL."""
+        self.client_errors += 1
+        now = time.monotonic()
+        if now - self._last_error_log >= ERROR_LOG_INTERVAL:
+            print(f'[SERVER] room {self.id} snapshot for {addr} failed '
+                  f'({self.client_errors} so far): {error!r}')
+            self._last_error_log = now
+
+    def stats(self):
+        """Everything worth watching about this room, see stats.py; JSON-ready."""
+        return {
+            "room": self.id,
+            "players": len(self.game.players),
+            "clients": len(self.clients),
+            "ticks": self.ticks,
+            "scheduler": self.scheduler.stats(),
+            "inputs": dict(self.input_stats),
+            "skipped": self.skipped,
+            "client_errors": self.client_errors,
+            "send_dropped": getattr(self.transport, "dropped", 0),
+            "codecs": self.snapshots.stats(),
+            "bots": self.bots.stats() if self.bots is not None else None,
+            "phases": {name: h.summary() for name, h in list(self.phases.items())},
+            "client_bytes": self.client_bytes.summary(),
+            "packets_out": self.packets_out.summary(),
+        }
+
+    def client_view(self, uid, client):
+        """Viewport (cx, cy, half_w, half_h) around a player's head, or None for everything."""
+        if self.view_half is None or client["is_spectator"]:
+            return None
+        me = self.game.players.get(uid)
+        if me is None:
+            return None
+        cx = round(me.x / VIEW_SNAP) * VIEW_SNAP
+        cy = round(me.y / VIEW_SNAP) * VIEW_SNAP
+        return (cx, cy) + self.view_half
+
+
+class WorkerPipe:
+    """
+    The router's writing end of a worker pipe. conn.send() blocks once the
+    pipe buffer is full (a worker stuck in a long tick), which would stall
+    the event loop and every other room with it, so a thread does the
+    writing from a queue, in order. Packets beyond PIPE_BACKLOG are dropped
+    like the network would; "drop" notices always queue, or a moved uuid
+    could stay behind in its old room.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.queue = queue.SimpleQueue()
+        threading.Thread(target=self._write, name=f"pipe-{conn.fileno()}", daemon=True).start()
+
+    def send(self, msg):
+        """Queue `msg` for the worker. Returns: False if it was a packet dropped on a full backlog."""
+        if msg[0] == "packet" and self.queue.qsize() >= PIPE_BACKLOG:
+            return False
+        self.queue.put(msg)
+        return True
+
+    def _write(self):
+        while True:
+            msg = self.queue.get()
+            try:
+                self.conn.send(msg)
+            except (EOFError, OSError):
+                return  # the worker is gone; UDPServer.worker_message reports it
+
+
+class RemoteRoom:
+    """Stand-in for a Room that lives in a worker process."""
+
+    def __init__(self, room_id, pipe):
+        self.id = room_id
+        self.pipe = pipe  # WorkerPipe, shared by the rooms of one worker
+        self.latest = None  # the worker's last stats report
+        self.pipe_dropped = 0  # packets dropped on a full pipe backlog
+
+    def handle(self, pkt, addr):
+        if not self.pipe.send(("packet", self.id, (pkt, addr))):
+            self.pipe_dropped += 1
+
+    def drop(self, uid):
+        self.pipe.send(("drop", self.id, uid))
+
+    def stats(self):
+        return self.latest
+
+
+class SocketSender:
+    """
+    sendto() on a plain non-blocking socket. A full send buffer drops the
+    datagram like the network would; so does any other send error (e.g.
+    EMSGSIZE for a snapshot bigger than a datagram), which the asyncio
+    transport only reported too.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.dropped = 0
+
+    def sendto(self, data, addr):
+        try:
+            self.sock.sendto(data, addr)
+        except OSError:
+            self.dropped += 1
+
+
+def start_workers(sock, args):
+    """
+    Fork the worker processes, spreading rooms round-robin.
+    Must run before the main event loop exists.
+    Returns: {room_id: pipe to the worker running it}.
+    """
+    conns = {}
+    for w in range(min(args.workers, args.rooms)):
+        room_ids = list(range(w, args.rooms, args.workers))
+        parent, child = multiprocessing.Pipe()
+        proc = multiprocessing.Process(target=worker_main, args=(child, sock, room_ids, args),
+                                       name=f"rooms-{w}", daemon=True)
+        proc.start()
+        child.close()
+        for rid in room_ids:
+            conns[rid] = parent
+    return conns
+
+
+def worker_main(conn, sock, room_ids, args):
+    try:
+        asyncio.run(_run_worker(conn, sock, room_ids, args))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _run_worker(conn, sock, room_ids, args):
+    loop = asyncio.get_running_loop()
+    sock.setblocking(False)
+    sender = SocketSender(sock)
+
+    def leave(room_id, uid):
+        conn.send(("left", room_id, uid))
+
+    rooms = {rid: make_room(rid, args, sender, leave) for rid in room_ids}
+    print(f'[SERVER] worker {multiprocessing.current_process().name} running rooms {room_ids}')
+
+    closed = loop.create_future()
+
+    def on_message():
+        try:
+            while conn.poll():
+                kind, rid, body = conn.recv()
+                if kind == "packet":
+                    rooms[rid].handle(*body)
+                elif kind == "drop":
+                    rooms[rid].drop(body)
+        except (EOFError, OSError):
+            # the main process is gone
+            loop.remove_reader(conn.fileno())
+            if not closed.done():
+                closed.set_result(None)
+
+    def orphaned():
+        loop.remove_reader(parent_sentinel)
+        if not closed.done():
+            closed.set_result(None)
+
+    loop.add_reader(conn.fileno(), on_message)
+    # forked workers hold both pipe ends, so EOF alone can't tell us the server died
+    parent_sentinel = multiprocessing.parent_process().sentinel
+    loop.add_reader(parent_sentinel, orphaned)
+
+    async def report():
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            for rid, room in rooms.items():
+                try:
+                    conn.send(("stats", rid, room.stats()))
+                except (EOFError, OSError):
+                    return  # the main process is gone, the worker is shutting down
+                except Exception as error:
+                    # a stats bug must not end the worker and every room in it
+                    print(f'[SERVER] room {rid} stats report failed: {error!r}')
+
+    ticking = [asyncio.ensure_future(room.tick_loop()) for room in rooms.values()]
+    ticking.append(asyncio.ensure_future(report()))
+    done, _ = await asyncio.wait(ticking + [closed], return_when=asyncio.FIRST_COMPLETED)
+    for task in ticking:
+        task.cancel()
+    for task in done:
+        task.result()  # re-raise a crashed tick loop
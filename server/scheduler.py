@@ -0,0 +1,95 @@
+"""
+Fixed-timestep tick scheduling on the event loop's monotonic clock.
+
+`asyncio.sleep(0.016)` followed by the tick work makes the real period
+16 ms + work time, so the game silently slows down under load. The
+scheduler instead keeps an absolute deadline that advances by exactly one
+period per simulated tick and tells the caller how many ticks are due.
+"""
+
+import asyncio
+from collections import deque
+
+TICK_RATE = 60
+MAX_CATCHUP = 4          # most Game.tick() calls run before one broadcast
+RATE_WINDOW = 2.0        # seconds of history behind tick_rate
+OVERRUN_LOG_INTERVAL = 5.0
+
+
+class TickScheduler:
+    def __init__(self, rate=TICK_RATE, max_catchup=MAX_CATCHUP):
+        self.period = 1.0 / rate
+        self.max_catchup = max(1, max_catchup)
+        self.deadline = None
+
+        # exposed stats
+        self.ticks = 0          # simulated ticks handed out
+        self.overruns = 0       # wakeups that found more than one tick due
+        self.dropped = 0        # ticks given up because they were past max_catchup
+        self.lag = 0.0          # seconds the last wakeup was behind its deadline
+
+        self._stamps = deque()
+        self._last_log = float("-inf")
+        self._logged_overruns = 0
+
+    async def wait(self):
+        """
+        Sleep until the next deadline.
+        Returns: number of simulation ticks due now (1..max_catchup).
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self.deadline is None:
+            self.deadline = now + self.period
+
+        delay = self.deadline - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+            now = loop.time()
+
+        self.lag = max(0.0, now - self.deadline)
+        due = int(self.lag // self.period) + 1
+        self.deadline += due * self.period
+
+        if due > 1:
+            self.overruns += 1
+            self._report_overrun(now)
+        if due > self.max_catchup:
+            self.dropped += due - self.max_catchup
+            due = self.max_catchup
+
+        self.ticks += due
+        self._stamps.append((now, due))
+        while now - self._stamps[0][0] > RATE_WINDOW:
+            self._stamps.popleft()
+        return due
+
+    @property
+    def tick_rate(self):
+        """Simulated ticks per second over the last RATE_WINDOW seconds."""
+        if len(self._stamps) < 2:
+            return 0.0
+        span = self._stamps[-1][0] - self._stamps[0][0]
+        if span <= 0:
+            return 0.0
+        # the first wakeup only marks the start of the window
+        return sum(due for _, due in list(self._stamps)[1:]) / span
+
+    def stats(self):
+        return {
+            "target_rate": 1.0 / self.period,
+            "tick_rate": self.tick_rate,
+            "lag_ms": self.lag * 1000,
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "dropped": self.dropped,
+        }
+
+    def _report_overrun(self, now):
+        if now - self._last_log < OVERRUN_LOG_INTERVAL:
+            return
+        print(f'[SERVER] tick overrun: {self.overruns - self._logged_overruns} late wakeups, '
+              f'lag {self.lag * 1000:.1f} ms, {self.tick_rate:.1f}/{1.0 / self.period:.0f} ticks/s, '
+              f'{self.dropped} ticks dropped so far')
+        self._last_log = now
+        self._logged_overruns = self.overruns
@@ -1,155 +1,262 @@
-from core import Game
+from scheduler import TICK_RATE, MAX_CATCHUP
+import rooms
+from rooms import RemoteRoom, SocketSender, WorkerPipe, VIEW_MARGIN, SEND_RATE, make_room
+from overview import SPECTATE_RATE
+from bots import BOT_PREFIX
+import fragment
+import stats
 import uuid
+import argparse
 import asyncio
 import json
+import os
 import struct
-from socket import *
 import time
+from socket import *
 
-# Attempt to import packets, fallback if not available
-try:
-    import packets
-except ImportError:
-    packets = None
-
-TIMEOUT_LIMIT = 50
+SERVER_PORT = 9999
 INPUT_STRUCT_FMT = '<8s16sfi' # Little endian, 32 bytes total
+PROM_INTERVAL = 5.0  # seconds between --prom-file rewrites
+# STATS replies are far bigger than the request and UDP sources can be
+# spoofed, so only these hosts (plus --stats-allow) get one
+STATS_ALLOW = ("127.0.0.1", "::1")
+MAX_UUID_BYTES = 255  # snapshot formats carry a uuid behind a u8 length
 
 class UDPServer(asyncio.DatagramProtocol):
-    def __init__(self, game):
-        self.game = game
-        self.clients = {} # Key: UUID, Value: {addr, last_updated, is_spectator}
-        self.pending_packets = []
+    """Reads every datagram on the port and routes it to the room its sender was placed in."""
+
+    def __init__(self, stats_allow=STATS_ALLOW):
+        self.rooms = []
+        self.placement = {} # Key: UUID, Value: (room id, is_spectator)
+        self.loads = []     # players per room, server-side bots included
         self.transport = None
+        self.started = time.monotonic()
+        self.packets_in = stats.Histogram(stats.BYTES_BUCKETS)
+        self.stats_allow = set(stats_allow)
 
     def connection_made(self, transport):
         self.transport = transport
 
+    def add_room(self, room, bots=0):
+        self.rooms.append(room)
+        self.loads.append(bots)
+
     def datagram_received(self, data, addr):
+        self.packets_in.observe(len(data))
         if b'meowboy' in data:
             print(f'[SERVER] recvd {data}')
-        pkt = None
-        try:
-            pkt = json.loads(data.decode('utf-8'))
-        except (UnicodeDecodeError, json.JSONDecodeError):
-            pass
-
-        # If not JSON, try Struct (Binary Input)
+        pkt = parse_packet(data)
         if pkt is None:
-            try:
-                if len(data) == struct.calcsize(INPUT_STRUCT_FMT):
-                    raw_type, raw_uuid, angle, boost = struct.unpack(INPUT_STRUCT_FMT, data)
-        # Try JSON first
-                    str_type = raw_type.decode('utf-8', errors='ignore').rstrip('\x00')
-                    str_uuid = raw_uuid.decode('utf-8', errors='ignore').rstrip('\x00')
-                    pkt = {
-                        "type": str_type,
-                        "uuid": str_uuid,
-                        "inp": {
-                            "angle": angle,
-                            "boost": bool(boost)
-                        }
-                    }
-                else:
-                    return
-            except Exception as e:
-                print(f'[SERVER] failed to decode binary data: {e}')
-                return
+            return
 
         msg_type = pkt.get("type")
         msg_uuid = pkt.get("uuid")
+
+        if msg_type == "STATS":
+            if addr[0] in self.stats_allow:
+                self.send_stats(pkt, addr)
+            return
         
         if not msg_uuid:
             return
+        if not valid_uuid(msg_uuid):
+            return  # it would break every snapshot that includes this player
+
+        if msg_type == "DISCOVER":
+            resp = json.dumps({"type": "DISCOVER_RECEIVED"}).encode()
+            self.transport.sendto(resp, addr)
+            return
 
-        # --- HANDLERS ---
+        if msg_uuid.startswith(BOT_PREFIX):
+            return  # reserved for the rooms' own bots, a client can't take one over
 
+        placed = self.placement.get(msg_uuid)
         if msg_type == "JOIN":
-            print(f'[SERVER] Player JOIN from {addr} ({msg_uuid})')
-            self.game.add_player(msg_uuid)
-            self.clients[msg_uuid] = {"addr": addr, "last_updated": time.time(), "is_spectator": False}
+            # a repeated JOIN stays where the player already is
+            if placed is None or placed[1]:
+                self.place(msg_uuid, min(range(len(self.rooms)), key=self.loads.__getitem__), False)
+        elif msg_type == "SPECTATE":
+            room_id = pkt.get("room", 0)
+            if not isinstance(room_id, int) or not 0 <= room_id < len(self.rooms):
+                room_id = 0
+            self.place(msg_uuid, room_id, True)
+        elif placed is None:
             return
+        self.rooms[self.placement[msg_uuid][0]].handle(pkt, addr)
 
-        if msg_type == "SPECTATE":
-            print(f'[SERVER] Spectator JOIN from {addr} ({msg_uuid})')
-            # Add to clients list so they get updates, but DON'T add to Game engine
-            self.clients[msg_uuid] = {"addr": addr, "last_updated": time.time(), "is_spectator": True}
-            return
+    def place(self, uid, room_id, is_spectator):
+        placed = self.placement.get(uid)
+        if placed is not None and placed != (room_id, is_spectator):
+            # otherwise the old room (or this one, for a player turned spectator)
+            # keeps the snake and keeps streaming to this address as before
+            self.rooms[placed[0]].drop(uid)
+        self.leave(None, uid)
+        self.placement[uid] = (room_id, is_spectator)
+        if not is_spectator:
+            self.loads[room_id] += 1
 
-        if msg_type == "HEARTBEAT":
-            # Keep alive for spectators or idle players
-            if msg_uuid in self.clients:
-                self.clients[msg_uuid]["last_updated"] = time.time()
+    def leave(self, room_id, uid):
+        """A room dropped `uid` (timeout or death); room_id None forgets it wherever it is."""
+        placed = self.placement.get(uid)
+        if placed is None or (room_id is not None and placed[0] != room_id):
             return
+        del self.placement[uid]
+        if not placed[1]:
+            self.loads[placed[0]] -= 1
 
-        if msg_type == "DISCOVER":
-            resp = json.dumps({"type": "DISCOVER_RECEIVED"}).encode()
-            self.transport.sendto(resp, addr)
-            return
+    def stats(self):
+        """Server-wide counters plus every room's Room.stats() (None for a worker that hasn't reported yet)."""
+        return {
+            "server": {
+                "uptime": time.monotonic() - self.started,
+                "placed": len(self.placement),
+                "loads": list(self.loads),
+                "packets_in": self.packets_in.summary(),
+                "pipe_dropped": sum(room.pipe_dropped for room in self.rooms if isinstance(room, RemoteRoom)),
+            },
+            "rooms": [room.stats() for room in self.rooms],
+        }
 
-        # Standard Input Packet
-        if msg_uuid in self.clients:
-            self.clients[msg_uuid]["addr"] = addr
-            self.pending_packets.append(pkt)
-
-    async def tick_loop(self):
-        while True:
-            await asyncio.sleep(0.016)
-
-            for packet in self.pending_packets:
-                uid = packet.get("uuid")
-                if uid in self.clients and not self.clients[uid]["is_spectator"]:
-                    self.clients[uid]["last_updated"] = time.time()
-                    if packet.get('type') == "INPUT":
-                        self.game.input(uid, packet.get('inp'))
-
-            inactive_users = []
-            for uid, client in self.clients.items():
-                if time.time() - client["last_updated"] > TIMEOUT_LIMIT:
-                    inactive_users.append(uid)
-
-            for uid in inactive_users:
-                is_spec = self.clients[uid]["is_spectator"]
-                del self.clients[uid]
-                if not is_spec:
-                    self.game.remove_player(uid)
-                print(f'[SERVER] Removed {"spectator" if is_spec else "player"} {uid} due to timeout.')
-
-            self.pending_packets = []
-            
-            dead_players = self.game.tick()
-
-            for dead_uid in dead_players:
-                if dead_uid in self.clients:
-                    client = self.clients[dead_uid]
-                    dead_msg = json.dumps({"type": "DEAD"}).encode('utf-8')
-                    self.transport.sendto(dead_msg, client['addr'])
-                    del self.clients[dead_uid]
-
-            state_snapshot = self.game.state()
-            json_payload = json.dumps(state_snapshot).encode('utf-8')
-
-            for uid, client in self.clients.items():
-                if uid == "meowboy" and packets:
-                    out_data = packets.compress_packet(state_snapshot)
-                else:
-                    out_data = json_payload
-                
-                self.transport.sendto(out_data, client['addr'])
-
-async def main():
-    game = Game()
+    def send_stats(self, pkt, addr):
+        """
+        Answer {"type": "STATS"} with the stats() snapshot as JSON; cumulative
+        histogram buckets only with "buckets": true, FRAG-split with "mtu".
+        """
+        snapshot = self.stats()
+        if not pkt.get("buckets"):
+            snapshot = stats.strip_buckets(snapshot)
+        data = json.dumps(dict(snapshot, type="STATS")).encode('utf-8')
+        mtu = fragment.clamp_mtu(pkt.get("mtu"))
+        for chunk in fragment.fragment(data, 0, mtu) if mtu else [data]:
+            self.transport.sendto(chunk, addr)
+
+    def worker_message(self, conn):
+        try:
+            while conn.poll():
+                kind, room_id, body = conn.recv()
+                if kind == "left":
+                    self.leave(room_id, body)
+                elif kind == "stats":
+                    self.rooms[room_id].latest = body
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(conn.fileno())
+            print('[SERVER] lost a room worker process')
+
+def valid_uuid(uid):
+    """A string that encodes to at most MAX_UUID_BYTES of UTF-8 (no lone surrogates)."""
+    if not isinstance(uid, str):
+        return False
+    try:
+        return len(uid.encode('utf-8')) <= MAX_UUID_BYTES
+    except UnicodeEncodeError:
+        return False
+
+def parse_packet(data):
+    """JSON packet or the 32-byte binary input struct -> dict, or None."""
+    try:
+        return json.loads(data.decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        pass
+
+    # If not JSON, try Struct (Binary Input)
+    try:
+        if len(data) == struct.calcsize(INPUT_STRUCT_FMT):
+            raw_type, raw_uuid, angle, boost = struct.unpack(INPUT_STRUCT_FMT, data)
+            str_type = raw_type.decode('utf-8', errors='ignore').rstrip('\x00')
+            str_uuid = raw_uuid.decode('utf-8', errors='ignore').rstrip('\x00')
+            return {
+                "type": str_type,
+                "uuid": str_uuid,
+                "inp": {
+                    "angle": angle,
+                    "boost": bool(boost)
+                }
+            }
+    except Exception as e:
+        print(f'[SERVER] failed to decode binary data: {e}')
+    return None
+
+async def write_prometheus(protocol, path):
+    """Rewrite `path` with the Prometheus text format every PROM_INTERVAL (for node_exporter's textfile collector)."""
+    tmp = path + ".tmp"
+    while True:
+        await asyncio.sleep(PROM_INTERVAL)
+        try:
+            with open(tmp, "w") as fh:
+                fh.write(stats.prometheus(protocol.stats()))
+            os.replace(tmp, path)  # scrapers never see a half-written file
+        except Exception as error:
+            # keep the game running; the next rewrite may well succeed
+            print(f'[SERVER] writing {path} failed: {error!r}')
+
+async def main(args, sock, workers):
     loop = asyncio.get_running_loop()
-    print('[SERVER] started server on 0.0.0.0:9999...')
-    transport, protocol = await loop.create_datagram_endpoint(
-        lambda: UDPServer(game),
-        local_addr=("0.0.0.0", 9999)
-    )
+    stats_allow = STATS_ALLOW + tuple(args.stats_allow)
+    transport, protocol = await loop.create_datagram_endpoint(lambda: UDPServer(stats_allow), sock=sock)
+
+    # rooms send from their broadcast threads, which asyncio transports don't allow
+    sender = SocketSender(sock)
+    pipes = {conn: WorkerPipe(conn) for conn in set(workers.values())}
+    ticking = []
+    for room_id in range(args.rooms):
+        conn = workers.get(room_id)
+        if conn is not None:
+            protocol.add_room(RemoteRoom(room_id, pipes[conn]), args.bots)
+            continue
+        room = make_room(room_id, args, sender, protocol.leave)
+        protocol.add_room(room, args.bots)
+        ticking.append(room.tick_loop())
+    for conn in set(workers.values()):
+        loop.add_reader(conn.fileno(), protocol.worker_message, conn)
 
+    if args.prom_file:
+        ticking.append(write_prometheus(protocol, args.prom_file))
+
+    n_workers = len(set(workers.values()))
+    print(f'[SERVER] started server on 0.0.0.0:{SERVER_PORT} with {args.rooms} room(s)'
+          + (f', {n_workers} worker process(es)' if n_workers else '') + '...')
     try:
-        await protocol.tick_loop()
+        if ticking:
+            await asyncio.gather(*ticking)
+        else:
+            await loop.create_future()  # all rooms run in workers
     finally:
         transport.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", choices=("python", "numpy"), default="python",
+                        help="simulation backend; numpy moves and collides every snake in one pass")
+    parser.add_argument("--tick-rate", type=float, default=TICK_RATE,
+                        help="simulation ticks per second")
+    parser.add_argument("--send-rate", type=float, default=SEND_RATE,
+                        help="snapshots per second to clients that JOIN with \"interpolate\": true "
+                             "(at most the tick rate); others get one per tick")
+    parser.add_argument("--spectate-rate", type=float, default=SPECTATE_RATE,
+                        help="overview messages per second for whole-map spectators")
+    parser.add_argument("--max-catchup", type=int, default=MAX_CATCHUP,
+                        help="max Game.tick() calls per broadcast when behind (1 disables catch-up)")
+    parser.add_argument("--view-margin", type=float, default=VIEW_MARGIN,
+                        help="world units sent beyond each player's screen")
+    parser.add_argument("--no-aoi", action="store_true",
+                        help="send every client the whole world")
+    parser.add_argument("--no-pipeline", action="store_true",
+                        help="encode and send snapshots on the event loop instead of a sender thread")
+    parser.add_argument("--rooms", type=int, default=1,
+                        help="independent arenas; new players join the emptiest one")
+    parser.add_argument("--bots", type=int, default=0,
+                        help="server-side bots kept alive in each room")
+    parser.add_argument("--prom-file",
+                        help="write stats to this file in the Prometheus text format every few seconds")
+    parser.add_argument("--stats-allow", action="append", default=[], metavar="ADDR",
+                        help="also answer STATS datagrams from this address (loopback always can)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="processes to run the rooms in (0 runs them all in this process)")
+    args = parser.parse_args()
+    args.rooms = max(1, args.rooms)
+
+    sock = socket(AF_INET, SOCK_DGRAM)
+    sock.bind(("0.0.0.0", SERVER_PORT))
+    # fork before any event loop exists; workers only send on the socket
+    workers = rooms.start_workers(sock, args) if args.workers > 0 else {}
+    asyncio.run(main(args, sock, workers))
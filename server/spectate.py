@@ -1,8 +1,11 @@
 import asyncio
 import json
+import math
 import uuid
 import pygame
+import struct
 import time
+from fragment import FRAG_MAGIC, DEFAULT_MTU, PartAssembler, Reassembler
 
 SERVER_ADDR = ("127.0.0.1", 9999)
 SPEC_UUID = str(uuid.uuid4())
@@ -28,28 +31,48 @@ class SpectatorClient(asyncio.DatagramProtocol):
         self.transport = None
         self.state = None
         self.connected = False
+        self.parts = PartAssembler()
+        # a PART holding one entry too big for the mtu still comes as FRAG
+        self.reassembler = Reassembler()
+        # the server picks how many body points to send from this
+        self.zoom = WIN_W / (MAP_W * 1.05)
 
     def connection_made(self, transport):
         self.transport = transport
         print(f"[SPECTATE] Sending handshake as {SPEC_UUID}...")
         
-        pkt = {"type": "SPECTATE", "uuid": SPEC_UUID}
+        # the low-rate decimated overview, as MTU-sized partial snapshots
+        pkt = {"type": "SPECTATE", "uuid": SPEC_UUID, "mtu": DEFAULT_MTU,
+               "feed": "overview", "food": "cells", "zoom": self.zoom}
         self.transport.sendto(json.dumps(pkt).encode("utf-8"))
         self.connected = True
 
         asyncio.create_task(self.heartbeat_loop())
 
     def datagram_received(self, data, addr):
+        if data[:4] == FRAG_MAGIC:
+            try:
+                data = self.reassembler.feed(data)
+            except struct.error:
+                return
+            if data is None:
+                return  # wait for the rest of the frame
         try:
-            self.state = json.loads(data.decode("utf-8"))
+            pkt = json.loads(data.decode("utf-8"))
         except Exception:
-            pass
+            return
+        if pkt.get("type") == "PART":
+            state = self.parts.feed(pkt)
+            if state is not None:
+                self.state = state
+        else:
+            self.state = pkt
 
     async def heartbeat_loop(self):
         while True:
             await asyncio.sleep(1.0)
             if self.transport:
-                pkt = {"type": "HEARTBEAT", "uuid": SPEC_UUID}
+                pkt = {"type": "HEARTBEAT", "uuid": SPEC_UUID, "zoom": self.zoom}
                 self.transport.sendto(json.dumps(pkt).encode("utf-8"))
 
 # --- Visualization Helpers ---
@@ -102,10 +125,14 @@ def draw_game(screen, state, cam_x, cam_y, zoom):
     if not state:
         return
 
-    # Draw Food
+    # Draw Food: overview food is [x, y, count] per cell, full snapshots list pellets
     for f in state.get("food", []):
-        sx, sy = world_to_screen(f["x"], f["y"], cam_x, cam_y, zoom, w, h)
-        r = max(1, int(f["size"] * zoom))
+        if isinstance(f, list):
+            sx, sy = world_to_screen(f[0], f[1], cam_x, cam_y, zoom, w, h)
+            r = max(1, int(4 * math.sqrt(f[2]) * zoom))
+        else:
+            sx, sy = world_to_screen(f["x"], f["y"], cam_x, cam_y, zoom, w, h)
+            r = max(1, int(f["size"] * zoom))
         pygame.draw.circle(screen, FOOD_COLOR, (sx, sy), r)
 
     # Draw Players
@@ -167,6 +194,7 @@ async def main():
             scale_x = current_w / (MAP_W * 1.05)
             scale_y = current_h / (MAP_H * 1.05)
             zoom = min(scale_x, scale_y)
+            protocol.zoom = zoom
 
             screen.fill(BG_COLOR)
             draw_game(screen, protocol.state, cam_x, cam_y, zoom)
@@ -0,0 +1,252 @@
+"""
+Low-overhead server instrumentation: phase timers and rolling histograms.
+
+Every Histogram keeps two views of the same observations:
+
+  - cumulative bucket counts, sum and count since start (what Prometheus
+    scrapes, see prometheus())
+  - the last WINDOW seconds, as the difference to a copy of the totals
+    taken every SLOT seconds, for live percentiles
+
+An observation is a bisect into fixed bucket bounds and a few increments;
+the clock is only read every ROLL_EVERY + 1 observations.
+Histograms are written from both the tick loop and the sender thread, so
+each has a lock.
+
+A PhaseTimer times consecutive phases of one pass: start(), then
+mark(name) after each phase. Game.tick and Room.tick_loop use one each;
+NULL_TIMER is the do-nothing default.
+"""
+
+import bisect
+import threading
+import time
+from collections import deque
+
+WINDOW = 10.0   # seconds the live percentiles cover
+SLOT = 1.0      # seconds per rolling slice
+# bucket upper bounds; the last bucket is +Inf
+TIME_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 12, 16, 25, 33, 66, 133)
+BYTES_BUCKETS = (64, 128, 256, 512, 1024, 1500, 4096, 16384, 65536, 262144)
+ROLL_EVERY = 15  # observations between clock reads (a power of two minus one)
+PROMETHEUS_PREFIX = "snake_"
+
+
+class Histogram:
+    def __init__(self, bounds, window=WINDOW, slot=SLOT):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.peak = float("-inf")  # largest value since the last mark
+        self.slot = slot
+        self.keep = max(1, int(window / slot))
+        # (time, counts, sum, count, peak of the slice it closes), oldest first;
+        # the window is the current totals minus the oldest mark
+        self.marks = deque([(time.monotonic(), list(self.counts), 0.0, 0, float("-inf"))])
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+            if value > self.peak:
+                self.peak = value
+            n = self.count
+        if not n & ROLL_EVERY:
+            self.roll()
+
+    def roll(self):
+        """Close the current slice once SLOT has passed; cheap enough to call often."""
+        now = time.monotonic()
+        if now - self.marks[-1][0] < self.slot:
+            return
+        with self.lock:
+            self.marks.append((now, list(self.counts), self.sum, self.count, self.peak))
+            self.peak = float("-inf")
+            while len(self.marks) > self.keep + 1:
+                self.marks.popleft()
+
+    def window(self):
+        """count, rate per second, mean, p50/p90/p99 (bucket upper bounds) and max over the window."""
+        self.roll()
+        with self.lock:
+            now = time.monotonic()
+            since, base, base_sum, base_n, _ = self.marks[0]
+            counts = [c - b for c, b in zip(self.counts, base)]
+            total = self.sum - base_sum
+            n = self.count - base_n
+            peak = max([m[4] for m in list(self.marks)[1:]] + [self.peak])
+        if not n:
+            return {"count": 0, "rate": 0.0}
+        return {
+            "count": n,
+            "rate": n / max(now - since, 1e-9),
+            "mean": total / n,
+            "p50": self._quantile(counts, n, 0.5, peak),
+            "p90": self._quantile(counts, n, 0.9, peak),
+            "p99": self._quantile(counts, n, 0.99, peak),
+            "max": peak,
+        }
+
+    def _quantile(self, counts, n, q, peak):
+        rank = q * n
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= rank:
+                # the +Inf bucket (and anything above the real max) reports the max seen
+                return min(self.bounds[i], peak) if i < len(self.bounds) else peak
+        return peak
+
+    def export(self):
+        """Cumulative buckets as [[upper bound, count], ...] plus sum and count; the last bound is "+Inf"."""
+        with self.lock:
+            counts, total, n = list(self.counts), self.sum, self.count
+        cumulative, seen = [], 0
+        for bound, c in zip(self.bounds + ("+Inf",), counts):
+            seen += c
+            cumulative.append([bound, seen])
+        return {"buckets": cumulative, "sum": total, "count": n}
+
+    def summary(self):
+        return dict(self.window(), **self.export())
+
+
+class PhaseTimer:
+    """Times consecutive phases into `histograms` (name -> Histogram, created on first use)."""
+
+    def __init__(self, histograms, bounds=TIME_BUCKETS_MS):
+        self.histograms = histograms
+        self.bounds = bounds
+        self._t = 0.0
+
+    def start(self):
+        self._t = time.perf_counter()
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.observe(name, (now - self._t) * 1000)
+        self._t = now
+
+    def observe(self, name, ms):
+        h = self.histograms.get(name)
+        if h is None:
+            h = self.histograms.setdefault(name, Histogram(self.bounds))
+        h.observe(ms)
+
+
+class _NullTimer:
+    def start(self):
+        pass
+
+    def mark(self, name):
+        pass
+
+    def observe(self, name, ms):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+def strip_buckets(snapshot):
+    """A stats snapshot with the cumulative buckets left out, for the compact STATS reply."""
+    if isinstance(snapshot, dict):
+        return {k: strip_buckets(v) for k, v in snapshot.items() if k != "buckets"}
+    if isinstance(snapshot, list):
+        return [strip_buckets(v) for v in snapshot]
+    return snapshot
+
+
+# ---------- Prometheus text format ----------
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in labels.items()) + "}"
+
+
+def _le(bound):
+    return bound if isinstance(bound, str) else repr(float(bound))
+
+
+class _Writer:
+    """Collects samples per metric family; the text format wants each family in one block."""
+
+    def __init__(self):
+        self.families = {}  # name -> (kind, help, lines), in first-seen order
+
+    def _family(self, name, metric_type, help_text):
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = (metric_type, help_text, [])
+        return family[2]
+
+    def sample(self, name, metric_type, help_text, value, **labels):
+        name = PROMETHEUS_PREFIX + name
+        self._family(name, metric_type, help_text).append(f"{name}{_labels(labels)} {float(value)!r}")
+
+    def histogram(self, name, help_text, hist, **labels):
+        name = PROMETHEUS_PREFIX + name
+        lines = self._family(name, "histogram", help_text)
+        for bound, count in hist["buckets"]:
+            lines.append(f"{name}_bucket{_labels(dict(labels, le=_le(bound)))} {count}")
+        lines.append(f"{name}_sum{_labels(labels)} {float(hist['sum'])!r}")
+        lines.append(f"{name}_count{_labels(labels)} {hist['count']}")
+
+    def text(self):
+        out = []
+        for name, (metric_type, help_text, lines) in self.families.items():
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {metric_type}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+def prometheus(snapshot):
+    """Render a UDPServer.stats() snapshot in the Prometheus text exposition format."""
+    w = _Writer()
+    server = snapshot["server"]
+    w.sample("uptime_seconds", "gauge", "Seconds since the server started.", server["uptime"])
+    w.histogram("packets_in_bytes", "Size of every datagram received.", server["packets_in"])
+    w.sample("pipe_dropped_total", "counter", "Packets dropped on a full worker pipe backlog.",
+             server["pipe_dropped"])
+    for room in snapshot["rooms"]:
+        if room is None:
+            continue  # a worker that hasn't reported yet
+        rid = room["room"]
+        w.sample("players", "gauge", "Snakes in the room.", room["players"], room=rid)
+        w.sample("clients", "gauge", "Connected clients.", room["clients"], room=rid)
+        sched = room["scheduler"]
+        w.sample("tick_rate", "gauge", "Simulated ticks per second.", sched["tick_rate"], room=rid)
+        w.sample("tick_lag_ms", "gauge", "How late the last wakeup was.", sched["lag_ms"], room=rid)
+        w.sample("ticks_total", "counter", "Simulated ticks.", sched["ticks"], room=rid)
+        w.sample("tick_overruns_total", "counter", "Wakeups that found more than one tick due.",
+                 sched["overruns"], room=rid)
+        w.sample("ticks_dropped_total", "counter", "Ticks given up past max catch-up.",
+                 sched["dropped"], room=rid)
+        w.sample("broadcasts_skipped_total", "counter", "Broadcasts put off a tick, sender busy.",
+                 room["skipped"], room=rid)
+        w.sample("client_errors_total", "counter", "Per-client snapshots that failed to encode or send.",
+                 room["client_errors"], room=rid)
+        w.sample("send_dropped_total", "counter", "Datagrams dropped on a full send buffer.",
+                 room["send_dropped"], room=rid)
+        for kind, n in room["inputs"].items():
+            w.sample("inputs_total", "counter", "INPUT packets by outcome.", n, room=rid, kind=kind)
+        for codec, c in room["codecs"].items():
+            w.sample("encodes_total", "counter", "Snapshot encodes.", c["encodes"], room=rid, codec=codec)
+            w.sample("encodes_shared_total", "counter", "Encodes reused for another client.",
+                     c["shared"], room=rid, codec=codec)
+            w.sample("encoded_bytes_total", "counter", "Bytes produced by encodes.",
+                     c["bytes"], room=rid, codec=codec)
+        if room.get("bots"):
+            w.sample("bots", "gauge", "Server-side bots alive.", room["bots"]["alive"], room=rid)
+        for phase, hist in room["phases"].items():
+            w.histogram("phase_ms", "Time spent per tick loop / Game.tick phase.", hist,
+                        room=rid, phase=phase)
+        w.histogram("client_bytes", "Bytes sent to one client per broadcast.", room["client_bytes"], room=rid)
+        w.histogram("packets_out_bytes", "Size of every datagram sent.", room["packets_out"], room=rid)
+    return w.text()
@@ -0,0 +1,113 @@
+"""
+Vectorized simulation backend for `core.Game`.
+
+`VectorGame.tick()` moves every snake in one NumPy pass with the same rules
+as `Snake.simulate`, and checks every head against every body with the same
+rule as `Game._collide`. Snakes stay plain `Snake` objects, so food, scores
+and snapshots read their scalars as ordinary attributes: once per tick the
+per-player scalars (angle, x, y, length_units, target_length_units and the
+pending input) are gathered into one array, stepped together, and copied
+back in the same loop that pushes the new heads into the position rings.
+Everything else is shared with `core.Game`, so `add_player` / `input` /
+`tick` / `state` behave exactly the same.
+"""
+
+import math
+
+import numpy as np
+
+from core import (
+    Game,
+    WIDTH, HEIGHT, SEGMENT_SPACING, BASE_SPEED, BOOST_MULT, BOOST_COST,
+    COLLISION_RADIUS, HASH_CELL,
+)
+
+_COLS, _ROWS = WIDTH // HASH_CELL, HEIGHT // HASH_CELL
+_AROUND = np.array((-1, 0, 1))
+
+
+def _cells(col, row):
+    """Flat hash cell index of integer cell coordinates, wrapped."""
+    return col % _COLS * _ROWS + row % _ROWS
+
+
+class VectorGame(Game):
+    def _simulate(self):
+        snakes = [s for s in self.players.values() if not s.dead]
+        if not snakes:
+            return
+        # a missing angle input gathers as NaN, a missing boost as False
+        rows = np.array([(s.angle, s.x, s.y, s.length_units, s.target_length_units,
+                          s.pending_input.get("angle", math.nan), s.pending_input.get("boost", False))
+                         for s in snakes], dtype=np.float64)
+        angle, x, y, length, target, desired, boost = rows.T
+
+        # angle smoothing towards the last requested heading
+        turning = ~np.isnan(desired)
+        diff = (desired[turning] - angle[turning] + math.pi) % (2 * math.pi) - math.pi
+        angle[turning] += diff * 0.25
+
+        # boost
+        boosting = (boost != 0) & (length > SEGMENT_SPACING * 8)
+        speed = np.where(boosting, BASE_SPEED * BOOST_MULT, BASE_SPEED)
+        length[boosting] -= BOOST_COST
+
+        # move + wrap (same single-step wrap as core.wrap_pos)
+        x += np.cos(angle) * speed
+        y += np.sin(angle) * speed
+        x[x < 0] += WIDTH
+        x[x >= WIDTH] -= WIDTH
+        y[y < 0] += HEIGHT
+        y[y >= HEIGHT] -= HEIGHT
+
+        max_positions = (target // SEGMENT_SPACING).astype(np.int64) + 300
+
+        # adjust length gradually
+        grow = length < target
+        shrink = length > target
+        length[grow] += 0.6
+        length[shrink] -= 0.6
+
+        for s, a, px, py, ln, sp, b, m in zip(snakes, angle.tolist(), x.tolist(), y.tolist(),
+                                              length.tolist(), speed.tolist(), boosting.tolist(),
+                                              max_positions.tolist()):
+            s.invalidate_segments()
+            s.angle, s.x, s.y, s.length_units, s.speed, s.boosting = a, px, py, ln, sp, b
+            ring = s.positions
+            ring.reserve(m)
+            ring.push(px, py)
+            ring.trim(m)
+
+    def _collide(self):
+        """
+        Game._collide with the spatial hash in arrays: body points sorted by
+        cell, and each head's 3x3 neighbourhood of cells looked up with
+        searchsorted. Like SpatialHash.hit, distances don't wrap.
+        """
+        snakes = list(self.players.values())
+        if not snakes:
+            return
+        bodies = [s.segments() for s in snakes]
+        points = np.concatenate(bodies).astype(np.float64)
+        owner = np.repeat(np.arange(len(snakes)), [len(b) for b in bodies])
+        keys = _cells((points[:, 0] // HASH_CELL).astype(np.intp), (points[:, 1] // HASH_CELL).astype(np.intp))
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+
+        heads = np.array([(s.x, s.y) for s in snakes], dtype=np.float64)
+        col = (heads[:, 0] // HASH_CELL).astype(np.intp)
+        row = (heads[:, 1] // HASH_CELL).astype(np.intp)
+        near = _cells((col[:, None] + _AROUND)[:, :, None], (row[:, None] + _AROUND)[:, None, :])
+        near = near.reshape(len(snakes), -1)
+        lo = np.searchsorted(keys, near, "left").ravel()
+        per = np.searchsorted(keys, near, "right").ravel() - lo
+
+        # every (head, body point in a neighbouring cell) pair
+        head = np.repeat(np.arange(near.size) // near.shape[1], per)
+        first = np.cumsum(per) - per
+        point = order[np.repeat(lo - first, per) + np.arange(per.sum())]
+        d = points[point] - heads[head]
+        hit = ((d * d).sum(axis=1) < COLLISION_RADIUS * COLLISION_RADIUS) & (owner[point] != head)
+
+        for i in np.unique(head[hit]).tolist():
+            snakes[i].dead = True
@@ -0,0 +1,173 @@
+"""
+Round trips through the snapshot wire formats, server encoder to client decoder.
+
+The client keeps its own copies of the decoders (client/netcode.py) so it
+doesn't depend on the server tree; these tests keep the two sides from
+drifting apart:
+
+  - full and delta SNAPs (server/delta.py), as JSON and every binary
+    version (server/packets.py), decoded by netcode.decode_snap and
+    netcode.DeltaDecoder
+  - FRAG datagrams (server/fragment.py) rebuilt by netcode.Reassembler
+  - PART datagrams rebuilt by fragment.PartAssembler, which spectate.py uses,
+    and the FRAG-cut PART sent when a snake head doesn't fit the mtu
+
+    python -m pytest tests
+"""
+
+import json
+import math
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "server"))
+sys.path.insert(1, os.path.join(ROOT, "client"))
+
+import delta  # noqa: E402
+import fragment  # noqa: E402
+import netcode  # noqa: E402
+import packets  # noqa: E402
+from bench import spawn  # noqa: E402
+from core import Game, WIDTH  # noqa: E402
+
+# binary positions are quantized to 1/65535 of the world
+QUANTUM = WIDTH / 65535
+FORMATS = [None] + list(packets.SNAP_VERSIONS)  # None: JSON SNAP messages
+
+
+def make_game(players=12, length=60, seed=1):
+    random.seed(seed)
+    game = Game()
+    for i in range(players):
+        spawn(game, f"p{i}", length)
+    return game
+
+
+def step(game, ticks, t=0):
+    for k in range(ticks):
+        for i, uid in enumerate(game.players):
+            game.input(uid, {"angle": math.sin((t + k) / 20 + i) * math.pi, "boost": (t + k + i) % 30 < 5})
+        game.tick()
+
+
+def send(msg, fmt):
+    """Server side: one SNAP message as it goes on the wire."""
+    if fmt is None:
+        return json.dumps(msg).encode('utf-8')
+    return packets.encode_snap(msg, fmt)
+
+
+def receive(data):
+    """Client side, as in client.UDPClient.datagram_received."""
+    if data[:4] == netcode.SNAP_MAGIC:
+        return netcode.decode_snap(data)
+    return json.loads(data.decode('utf-8'))
+
+
+def assert_matches(state, game, fmt):
+    """The decoded state shows exactly the game: every snake head and body, every pellet."""
+    tol = 1e-9 if fmt is None else QUANTUM
+    assert set(state["players"]) == set(game.players)
+    for uid, s in game.players.items():
+        p = state["players"][uid]
+        assert p["x"] == pytest.approx(s.x, abs=tol)
+        assert p["y"] == pytest.approx(s.y, abs=tol)
+        assert p["boost"] == s.boosting
+        assert p["length"] == pytest.approx(s.length_units, rel=1e-6)
+        turn = (p["angle"] - s.angle + math.pi) % (2 * math.pi) - math.pi
+        assert abs(turn) < (1e-9 if fmt is None else 2e-4)
+        expected = [[s.x, s.y]] + s.trail()[1]
+        assert np.allclose(np.asarray(p["segments"], dtype=float), expected, atol=tol)
+    got = sorted((f["size"], f["x"], f["y"]) for f in state["food"])
+    want = sorted((f.size, f.x, f.y) for f in game.food)
+    assert np.allclose(got, want, atol=tol)
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_full_snapshot(fmt):
+    game = make_game()
+    step(game, 5)
+    msg = delta.DeltaEncoder().encode(delta.capture(game))
+    assert "base" not in msg
+    state = netcode.DeltaDecoder().apply(receive(send(msg, fmt)))
+    assert_matches(state, game, fmt)
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_delta_snapshots(fmt):
+    game = make_game()
+    encoder, decoder = delta.DeltaEncoder(), netcode.DeltaDecoder()
+    deltas = 0
+    for t in range(12):
+        step(game, 3, t * 3)
+        if t == 4:
+            game.remove_player(next(iter(game.players)))
+            game.add_player("late")
+        msg = encoder.encode(delta.capture(game))
+        msg["input"] = [t, 2]
+        deltas += "base" in msg
+        got = receive(send(msg, fmt))
+        state = decoder.apply(got)
+        assert_matches(state, game, fmt)
+        if fmt != 1:  # v1 has no input echo
+            assert got["input"] == [t, 2]
+        if t % 3 != 2:  # lose some acks, so deltas skip back to older baselines
+            encoder.ack(got["seq"])
+    assert deltas >= 6
+
+
+def test_frag_reassembly():
+    game = make_game(players=40, length=200)
+    data = packets.encode_snap(delta.DeltaEncoder().encode(delta.capture(game)))
+    mtu = 1200
+    reassembler = netcode.Reassembler()
+
+    lost = fragment.fragment(data, 1, mtu)
+    chunks = fragment.fragment(data, 2, mtu)
+    assert len(chunks) > 1
+    assert all(len(c) <= mtu - fragment.UDP_OVERHEAD for c in chunks)
+    # frame 1 loses a chunk, frame 2 arrives out of order and completes
+    for c in lost[1:]:
+        assert reassembler.feed(c) is None
+    out = [reassembler.feed(c) for c in reversed(chunks)]
+    assert out[:-1] == [None] * (len(chunks) - 1)
+    assert out[-1] == data
+    assert reassembler.feed(lost[0]) is None  # older than a completed frame
+    assert_matches(netcode.DeltaDecoder().apply(netcode.decode_snap(out[-1])), game, packets.SNAP_VERSION)
+
+
+def test_part_split():
+    game = make_game(players=40, length=200)
+    state = json.loads(json.dumps(game.state()))
+    mtu = 1200
+    datagrams = fragment.split_state(state, 7, mtu)
+    assert len(datagrams) > 1
+    assert all(len(d) <= mtu - fragment.UDP_OVERHEAD and d[:1] == b'{' for d in datagrams)
+
+    assembler = fragment.PartAssembler()
+    out = [assembler.feed(json.loads(d)) for d in datagrams]
+    assert out[:-1] == [None] * (len(datagrams) - 1)
+    assert out[-1] == state
+
+
+def test_part_oversized_head():
+    game = make_game(players=3, length=50)
+    spawn(game, "u" * 255, 50)
+    state = json.loads(json.dumps(game.state()))
+    mtu = fragment.MIN_MTU
+    datagrams = fragment.split_state(state, 9, mtu)
+    assert datagrams[0][:4] == fragment.FRAG_MAGIC
+    assert all(len(d) <= mtu - fragment.UDP_OVERHEAD for d in datagrams)
+
+    # as spectate.py receives them: FRAG first, then PART
+    reassembler, assembler = fragment.Reassembler(), fragment.PartAssembler()
+    for d in datagrams:
+        if d[:4] == fragment.FRAG_MAGIC:
+            d = reassembler.feed(d)
+        out = d and assembler.feed(json.loads(d))
+    assert out == state
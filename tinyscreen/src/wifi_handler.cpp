@@ -116,7 +116,7 @@ IPAddress receive_discover(WiFiUDP &udp, char* received_packet) {
 }
 
 void join_server(WiFiUDP &udp, IPAddress remote_ip) {
-  send_packet(udp, remote_ip, 9999, "{\"type\": \"JOIN\", \"uuid\": \"meowboy\"}");
+  send_packet(udp, remote_ip, 9999, "{\"type\": \"JOIN\", \"uuid\": \"meowboy\", \"codec\": \"tinyscreen\"}");
   serialf("[debug] sent JOIN packet to remote %s\n", ip_to_str(remote_ip));
 }
 